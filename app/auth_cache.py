@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.database import check_api_key_valid, get_cache_generation
+
+# API key cache settings (override through the environment)
+API_KEY_CACHE_TTL = float(os.environ.get("SPAM_API_KEY_CACHE_TTL", "60"))
+API_KEY_NEGATIVE_TTL = float(os.environ.get("SPAM_API_KEY_NEGATIVE_TTL", "10"))
+API_KEY_CACHE_SIZE = int(os.environ.get("SPAM_API_KEY_CACHE_SIZE", "10000"))
+API_KEY_GENERATION_CHECK = float(os.environ.get("SPAM_API_KEY_GENERATION_CHECK", "1"))
+
+
+class ApiKeyCache:
+    """In-process cache of API key validity with negative caching.
+
+    Valid keys are cached for `ttl` seconds and unknown/inactive keys for
+    `negative_ttl`, so repeated guesses never reach SQLite. The LRU bound keeps
+    a flood of distinct guesses from growing memory. Other workers' changes are
+    picked up through the `api_keys` generation counter, which SQLite triggers
+    bump on every update or delete (new keys need no invalidation); it is read
+    at most once every `generation_check` seconds, so lookups are memory-only
+    in the common case.
+    """
+
+    def __init__(self, ttl=API_KEY_CACHE_TTL, negative_ttl=API_KEY_NEGATIVE_TTL,
+                 max_size=API_KEY_CACHE_SIZE, generation_check=API_KEY_GENERATION_CHECK):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.generation_check = generation_check
+        self._data = OrderedDict()  # key -> (is_valid, expires_at)
+        self._lock = threading.Lock()
+        self._generation = None
+        self._next_generation_check = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_generation(self, now):
+        if now < self._next_generation_check:
+            return
+        self._next_generation_check = now + self.generation_check
+        generation = get_cache_generation("api_keys")
+        with self._lock:
+            if generation != self._generation:
+                if self._generation is not None:
+                    self._data.clear()
+                    self.invalidations += 1
+                self._generation = generation
+
+    def is_valid(self, key):
+        now = time.monotonic()
+        self._check_generation(now)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        valid = check_api_key_valid(key)
+        expires_at = now + (self.ttl if valid else self.negative_ttl)
+        with self._lock:
+            self._data[key] = (valid, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return valid
+
+    def invalidate(self, key=None):
+        """Drop one key (or everything). Call after creating or deactivating keys."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+            self.invalidations += 1
+        # Re-read the generation on the next lookup
+        self._next_generation_check = 0.0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+api_key_cache = ApiKeyCache()
@@ -0,0 +1,123 @@
+import os
+
+import torch
+from transformers import BertForSequenceClassification
+from transformers.modeling_outputs import SequenceClassifierOutput
+
+# Supported inference backends
+BACKENDS = ("fp32", "int8", "onnx", "onnx-int8")
+
+# Exported artifacts, written next to the weights by scripts/export_model.py
+ONNX_FILENAME = "model.onnx"
+ONNX_INT8_FILENAME = "model.int8.onnx"
+# safetensors weights are memory-mapped instead of unpickled, which loads much faster
+SAFETENSORS_FILENAME = "model.safetensors"
+
+
+class OnnxSequenceClassifier:
+    """onnxruntime session that can be called like `BertForSequenceClassification`."""
+
+    def __init__(self, onnx_path, intra_op_threads=0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, input_ids, attention_mask, token_type_ids=None):
+        feeds = {
+            "input_ids": input_ids.cpu().numpy(),
+            "attention_mask": attention_mask.cpu().numpy(),
+        }
+        if "token_type_ids" in self.input_names:
+            if token_type_ids is None:
+                token_type_ids = torch.zeros_like(input_ids)
+            feeds["token_type_ids"] = token_type_ids.cpu().numpy()
+        logits = self.session.run(["logits"], feeds)[0]
+        return SequenceClassifierOutput(logits=torch.from_numpy(logits))
+
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Exposes plain logits so the exported graph has a single named output."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+
+def load_backend(model_path, backend="fp32", intra_op_threads=0):
+    """Loads the spam classifier for the given backend. Returns (model, device)."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+
+    if backend in ("onnx", "onnx-int8"):
+        filename = ONNX_FILENAME if backend == "onnx" else ONNX_INT8_FILENAME
+        onnx_path = os.path.join(model_path, filename)
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(f"{onnx_path} not found, run scripts/export_model.py first")
+        return OnnxSequenceClassifier(onnx_path, intra_op_threads), torch.device("cpu")
+
+    if not os.path.exists(os.path.join(model_path, SAFETENSORS_FILENAME)):
+        print(f"No {SAFETENSORS_FILENAME} in {model_path}, unpickling weights; "
+              "run scripts/export_model.py to convert them for faster startup")
+    # from_pretrained prefers model.safetensors when both formats are present
+    model = BertForSequenceClassification.from_pretrained(model_path)
+    if backend == "int8":
+        # Dynamic quantization only has CPU kernels
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        device = torch.device("cpu")
+    else:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model.to(device)
+    model.eval()
+    return model, device
+
+
+def export_safetensors(model_path):
+    """Re-saves the weights as model.safetensors next to the pickled checkpoint. Returns its path."""
+    model = BertForSequenceClassification.from_pretrained(model_path)
+    model.save_pretrained(model_path, safe_serialization=True)
+    return os.path.join(model_path, SAFETENSORS_FILENAME)
+
+
+def export_onnx(model_path, opset_version=14):
+    """Exports the fp32 model to ONNX plus a dynamically int8-quantized copy. Returns both paths."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    model = BertForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+
+    onnx_path = os.path.join(model_path, ONNX_FILENAME)
+    int8_path = os.path.join(model_path, ONNX_INT8_FILENAME)
+
+    dummy_ids = torch.ones((2, 16), dtype=torch.long)
+    dummy_mask = torch.ones((2, 16), dtype=torch.long)
+    with torch.no_grad():
+        torch.onnx.export(
+            _LogitsOnly(model),
+            (dummy_ids, dummy_mask),
+            onnx_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=opset_version,
+        )
+
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+    return onnx_path, int8_path
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import time
+
+from app.executor import InferenceQueueFull
+from app.metrics import Histogram
+
+# Micro-batching settings (override through the environment)
+BATCH_MAX_SIZE = int(os.environ.get("SPAM_BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("SPAM_BATCH_MAX_WAIT_MS", "5"))
+BATCH_MAX_QUEUE = int(os.environ.get("SPAM_BATCH_MAX_QUEUE", "256"))
+
+BATCH_SIZE = Histogram("spam_batch_size", "Requests per micro-batch forward pass.", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+QUEUE_WAIT_SECONDS = Histogram("spam_batch_queue_wait_seconds", "Time a /predict request waits for its batch to start.")
+
+
+class MicroBatcher:
+    """Collects concurrent predict requests and runs them as one forward pass.
+
+    Callers `await submit(text)`. A single worker task waits for the first
+    queued request, then keeps collecting until either `max_batch_size`
+    requests are waiting or `max_wait_ms` has passed, runs `predict_fn` on the
+    whole batch and resolves each caller's future with its own result.
+
+    When an `executor` is given the forward pass runs on it instead of the
+    event loop. At most `max_queue` requests may wait; further submissions
+    raise `InferenceQueueFull`.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                 executor=None, max_queue=BATCH_MAX_QUEUE):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.executor = executor
+        self.max_queue = max(1, int(max_queue))
+        self.queue = None
+        self._worker = None
+        self._in_flight = []  # the batch being predicted
+
+        # Tuning counters
+        self.total_requests = 0
+        self.total_batches = 0
+        self.max_queue_depth = 0
+        self.batch_size_histogram = {}
+        self.queue_depth_histogram = {}
+        self.rejected = 0
+
+    async def start(self):
+        """Start the background batching task on the running event loop."""
+        if self._worker is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the worker and fail every request still waiting, including the batch in progress."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        waiting = [future for _, future, _ in self._in_flight]
+        self._in_flight = []
+        while not self.queue.empty():
+            waiting.append(self.queue.get_nowait()[1])
+        for future in waiting:
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, text):
+        """Queue a single text and wait for its prediction."""
+        if self._worker is None:
+            raise RuntimeError("Batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((text, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise InferenceQueueFull("Batching queue is full")
+        depth = self.queue.qsize()
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        self.queue_depth_histogram[depth] = self.queue_depth_histogram.get(depth, 0) + 1
+        return await future
+
+    async def _collect(self):
+        """Wait for one request, then gather more until the batch is full or the wait expires."""
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        # Take anything else that is already queued without waiting further
+        while len(batch) < self.max_batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (e.g. client disconnect) don't need a result
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                continue
+
+            size = len(batch)
+            self.total_batches += 1
+            self.total_requests += size
+            self.batch_size_histogram[size] = self.batch_size_histogram.get(size, 0) + 1
+            BATCH_SIZE.observe(size)
+            started = time.perf_counter()
+            for _, _, queued_at in batch:
+                QUEUE_WAIT_SECONDS.observe(started - queued_at)
+
+            # Kept if the worker is cancelled mid-batch, so stop() can fail these callers
+            self._in_flight = batch
+            try:
+                results = await self._predict([text for text, _, _ in batch])
+            except Exception as e:
+                self._in_flight = []
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self._in_flight = []
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def _predict(self, texts):
+        if self.executor is not None:
+            return await self.executor.run(self.predict_fn, texts)
+        return self.predict_fn(texts)
+
+    def stats(self):
+        """Queue depth and batch-size histograms for latency/throughput tuning."""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+            "total_requests": self.total_requests,
+            "total_batches": self.total_batches,
+            "avg_batch_size": (self.total_requests / self.total_batches) if self.total_batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_size_histogram.items())),
+            "queue_depth_histogram": dict(sorted(self.queue_depth_histogram.items())),
+        }
@@ -0,0 +1,117 @@
+import json
+import math
+import os
+import re
+import zlib
+
+# First stage of the prediction cascade: logistic regression over hashed word
+# and character n-grams (trained by scripts/train_cascade.py). It answers the
+# messages it is confident about directly and defers the rest to BERT.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASCADE_PATH = os.environ.get("SPAM_CASCADE_PATH", os.path.join(BASE_DIR, "models", "cascade"))
+CASCADE_ENABLED = os.environ.get("SPAM_CASCADE", "1") == "1"
+
+# Spam probability at or below which the filter answers Ham, and at or above which
+# it answers Spam. Unset means use the thresholds chosen at training time.
+CASCADE_HAM_THRESHOLD = os.environ.get("SPAM_CASCADE_HAM_THRESHOLD")
+CASCADE_SPAM_THRESHOLD = os.environ.get("SPAM_CASCADE_SPAM_THRESHOLD")
+
+WEIGHTS_FILENAME = "weights.npy"
+CONFIG_FILENAME = "config.json"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def hashed_features(text, n_features, char_ngram=3):
+    """Sorted, de-duplicated feature indices for word unigrams/bigrams and character n-grams.
+
+    crc32 is used rather than `hash()`, which is salted per process.
+    """
+    text = " ".join(text.lower().split())
+    words = _WORD_RE.findall(text)
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {text} "
+    grams += [f"c:{padded[i:i + char_ngram]}" for i in range(len(padded) - char_ngram + 1)]
+    mask = n_features - 1
+    return sorted({zlib.crc32(g.encode("utf-8")) & mask for g in grams})
+
+
+class FirstStageFilter:
+    """Hashed n-gram logistic regression with a confidence band deferred to BERT."""
+
+    def __init__(self, weights, intercept, ham_threshold, spam_threshold, char_ngram=3):
+        n_features = len(weights)
+        if n_features & (n_features - 1):
+            raise ValueError("The number of hashed features must be a power of two")
+        self.weights = weights
+        self.intercept = float(intercept)
+        self.n_features = n_features
+        self.char_ngram = char_ngram
+        self.ham_threshold = float(ham_threshold)
+        self.spam_threshold = float(spam_threshold)
+
+    @classmethod
+    def load(cls, path=CASCADE_PATH):
+        import numpy as np
+
+        with open(os.path.join(path, CONFIG_FILENAME)) as f:
+            config = json.load(f)
+        weights = np.load(os.path.join(path, WEIGHTS_FILENAME), mmap_mode="r")
+        return cls(
+            weights,
+            config["intercept"],
+            config["ham_threshold"] if CASCADE_HAM_THRESHOLD is None else CASCADE_HAM_THRESHOLD,
+            config["spam_threshold"] if CASCADE_SPAM_THRESHOLD is None else CASCADE_SPAM_THRESHOLD,
+            config.get("char_ngram", 3),
+        )
+
+    def save(self, path, **extra):
+        import numpy as np
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, WEIGHTS_FILENAME), np.asarray(self.weights, dtype=np.float32))
+        config = {
+            "n_features": self.n_features,
+            "char_ngram": self.char_ngram,
+            "intercept": self.intercept,
+            "ham_threshold": self.ham_threshold,
+            "spam_threshold": self.spam_threshold,
+            **extra,
+        }
+        with open(os.path.join(path, CONFIG_FILENAME), "w") as f:
+            json.dump(config, f, indent=2)
+
+    def features(self, text):
+        return hashed_features(text, self.n_features, self.char_ngram)
+
+    def spam_probability(self, text):
+        score = self.intercept + float(self.weights[self.features(text)].sum())
+        # Clamped so exp() cannot overflow on extreme scores
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, score))))
+
+    def decide(self, text):
+        """'Spam' or 'Ham' if the filter is confident, otherwise None (ask BERT)."""
+        p = self.spam_probability(text)
+        if p >= self.spam_threshold:
+            return "Spam"
+        if p <= self.ham_threshold:
+            return "Ham"
+        return None
+
+    def decide_many(self, texts):
+        return [self.decide(text) for text in texts]
+
+
+def load_first_stage(path=CASCADE_PATH):
+    """The trained first-stage filter, or None if it is disabled or has not been trained."""
+    if not CASCADE_ENABLED:
+        return None
+    if not os.path.exists(os.path.join(path, CONFIG_FILENAME)):
+        print(f"No first-stage filter in {path} (run scripts/train_cascade.py); every message goes to BERT.")
+        return None
+    first_stage = FirstStageFilter.load(path)
+    print(f"First-stage filter loaded: Ham at p <= {first_stage.ham_threshold}, "
+          f"Spam at p >= {first_stage.spam_threshold}")
+    return first_stage
@@ -1,153 +1,516 @@
 import sqlite3
 import os
+import queue
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
-DB_PATH = "spam_detection.db"
+from app.metrics import db_timed
+
+DB_PATH = os.environ.get("SPAM_DB_PATH", "spam_detection.db")
+
+# Connection pool and pragma settings (override through the environment)
+DB_POOL_SIZE = int(os.environ.get("SPAM_DB_POOL_SIZE", "4"))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("SPAM_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_SYNCHRONOUS = os.environ.get("SPAM_DB_SYNCHRONOUS", "NORMAL")
+DB_CACHE_SIZE = int(os.environ.get("SPAM_DB_CACHE_SIZE", "-16000"))  # negative = KiB
+DB_MMAP_SIZE = int(os.environ.get("SPAM_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_STATEMENT_CACHE = int(os.environ.get("SPAM_DB_STATEMENT_CACHE", "128"))
 
 import secrets
 
+class ConnectionPool:
+    """Small pool of long-lived SQLite connections in WAL mode.
+
+    Connections are opened lazily up to `size` and reused, so each call pays
+    neither connection setup nor statement preparation (sqlite3 keeps a
+    per-connection prepared statement cache). WAL lets readers proceed while a
+    writer commits, and `busy_timeout` makes concurrent writers from other
+    uvicorn workers wait instead of failing with "database is locked".
+    """
+
+    def __init__(self, path, size=DB_POOL_SIZE):
+        self.path = path
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000.0,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size={DB_CACHE_SIZE}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get()
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._created = 0
+
+_pool = None
+# Reentrant: the schema is created through get_connection() while the lock is held
+_pool_lock = threading.RLock()
+_initialized_paths = set()
+
+def get_pool():
+    """Return this process's pool; a forked worker never reuses its parent's connections.
+
+    The schema is created on first use of each database path rather than on
+    import, so importing this module touches no files.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._pid != os.getpid() or _pool.path != DB_PATH:
+            _pool = ConnectionPool(DB_PATH)
+        if _pool.path not in _initialized_paths:
+            _initialized_paths.add(_pool.path)
+            try:
+                init_db()
+            except Exception:
+                _initialized_paths.discard(_pool.path)
+                raise
+        return _pool
+
+@contextmanager
+def get_connection():
+    """Borrow a pooled connection; commits on success and rolls back on error."""
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.release(conn)
+
 def init_db():
     """Initialize the database with the prediction_logs and api_keys tables."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS prediction_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            text TEXT NOT NULL,
-            prediction TEXT NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            user_feedback TEXT
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS api_keys (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            key TEXT NOT NULL UNIQUE,
-            is_active BOOLEAN DEFAULT 1,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS prediction_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL,
+                prediction TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                user_feedback TEXT
+            )
+        ''')
+        # Which cascade stage decided ('filter', 'bert' or 'cache'); added after the table
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(prediction_logs)")}
+        if "stage" not in columns:
+            try:
+                cursor.execute("ALTER TABLE prediction_logs ADD COLUMN stage TEXT")
+            except sqlite3.OperationalError as e:
+                # Another worker added it first
+                if "duplicate column" not in str(e):
+                    raise
+        # Log browsing filters and retention scan by these; rowid (id) is the implicit last column
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_prediction_logs_timestamp ON prediction_logs (timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_prediction_logs_prediction ON prediction_logs (prediction, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_prediction_logs_feedback ON prediction_logs (user_feedback, timestamp)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS api_keys (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL UNIQUE,
+                is_active BOOLEAN DEFAULT 1,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS prediction_cache (
+                key TEXT PRIMARY KEY,
+                prediction TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS cache_generations (
+                name TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO cache_generations (name, generation) VALUES ('api_keys', 0)")
+        # Deactivating or deleting a key bumps the generation so every worker drops
+        # its key cache. Inserts do not need to: a new random key is at worst
+        # negatively cached for SPAM_API_KEY_NEGATIVE_TTL seconds. This halves the
+        # flushes caused by key churn but does not prevent them: any caller can
+        # generate a key and revoke it, and the revoke flushes every worker's cache.
+        cursor.execute("DROP TRIGGER IF EXISTS api_keys_generation_insert")
+        for event in ("UPDATE", "DELETE"):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS api_keys_generation_{event.lower()} AFTER {event} ON api_keys
+                BEGIN
+                    UPDATE cache_generations SET generation = generation + 1 WHERE name = 'api_keys';
+                END
+            ''')
+    init_stats_rollups()
+
+# Rollup maintenance, run by SQLite on every write so that all writers
+# (request path, log writer, other workers) keep the counters in step.
+STATS_TRIGGERS = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_on_insert AFTER INSERT ON prediction_logs
+    BEGIN
+        INSERT INTO stats_counters (kind, key, count) VALUES ('total', '', 1)
+            ON CONFLICT (kind, key) DO UPDATE SET count = count + 1;
+        INSERT INTO stats_counters (kind, key, count) VALUES ('prediction', NEW.prediction, 1)
+            ON CONFLICT (kind, key) DO UPDATE SET count = count + 1;
+        INSERT INTO stats_counters (kind, key, count)
+            SELECT 'feedback', NEW.user_feedback, 1 WHERE NEW.user_feedback IS NOT NULL
+            ON CONFLICT (kind, key) DO UPDATE SET count = count + 1;
+        INSERT INTO stats_daily (date, prediction, count) VALUES (DATE(NEW.timestamp), NEW.prediction, 1)
+            ON CONFLICT (date, prediction) DO UPDATE SET count = count + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stats_on_feedback AFTER UPDATE OF user_feedback ON prediction_logs
+    WHEN OLD.user_feedback IS NOT NEW.user_feedback
+    BEGIN
+        UPDATE stats_counters SET count = count - 1
+            WHERE kind = 'feedback' AND key = OLD.user_feedback;
+        INSERT INTO stats_counters (kind, key, count)
+            SELECT 'feedback', NEW.user_feedback, 1 WHERE NEW.user_feedback IS NOT NULL
+            ON CONFLICT (kind, key) DO UPDATE SET count = count + 1;
+    END
+    ''',
+]
+
+def init_stats_rollups():
+    """Create the stats counter tables and triggers, backfilling them once from prediction_logs."""
+    with get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS stats_counters (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (kind, key)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS stats_daily (
+                date TEXT NOT NULL,
+                prediction TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (date, prediction)
+            )
+        ''')
+        # The 'total' row is never deleted, so it marks the backfill as done
+        backfilled = conn.execute("SELECT 1 FROM stats_counters WHERE kind = 'total'").fetchone()
+        if not backfilled:
+            conn.execute("DELETE FROM stats_counters")
+            conn.execute("DELETE FROM stats_daily")
+            conn.execute("INSERT INTO stats_counters (kind, key, count) SELECT 'total', '', COUNT(*) FROM prediction_logs")
+            conn.execute('''
+                INSERT INTO stats_counters (kind, key, count)
+                SELECT 'prediction', prediction, COUNT(*) FROM prediction_logs GROUP BY prediction
+            ''')
+            conn.execute('''
+                INSERT INTO stats_counters (kind, key, count)
+                SELECT 'feedback', user_feedback, COUNT(*) FROM prediction_logs
+                WHERE user_feedback IS NOT NULL GROUP BY user_feedback
+            ''')
+            conn.execute('''
+                INSERT INTO stats_daily (date, prediction, count)
+                SELECT DATE(timestamp), prediction, COUNT(*) FROM prediction_logs
+                GROUP BY DATE(timestamp), prediction
+            ''')
+        for trigger in STATS_TRIGGERS:
+            conn.execute(trigger)
 
+@db_timed
 def create_api_key() -> str:
     """Generate and store a new API key."""
     new_key = f"sk_live_{secrets.token_urlsafe(16)}"
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO api_keys (key) VALUES (?)",
-        (new_key,)
-    )
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        conn.execute(
+            "INSERT INTO api_keys (key) VALUES (?)",
+            (new_key,)
+        )
     return new_key
 
+@db_timed
 def check_api_key_valid(key: str) -> bool:
     """Check if an API key exists and is active."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT 1 FROM api_keys WHERE key = ? AND is_active = 1",
-        (key,)
-    )
-    result = cursor.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        result = conn.execute(
+            "SELECT 1 FROM api_keys WHERE key = ? AND is_active = 1",
+            (key,)
+        ).fetchone()
     return result is not None
 
-def log_prediction(text: str, prediction: str) -> int:
+@db_timed
+def deactivate_api_key(key: str) -> bool:
+    """Deactivate an API key. Returns False if it was not active."""
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "UPDATE api_keys SET is_active = 0 WHERE key = ? AND is_active = 1",
+            (key,)
+        )
+        return cursor.rowcount > 0
+
+@db_timed
+def get_cache_generation(name: str) -> int:
+    """Current generation of a cached table; bumped by triggers on every change."""
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT generation FROM cache_generations WHERE name = ?",
+            (name,)
+        ).fetchone()
+    return row[0] if row else 0
+
+@db_timed
+def log_prediction(text: str, prediction: str, stage: str = None) -> int:
     """Log a prediction and return the log ID."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO prediction_logs (text, prediction, timestamp) VALUES (?, ?, ?)",
-        (text, prediction, datetime.now())
-    )
-    log_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return log_id
-
-def update_feedback(log_id: int, feedback: str):
-    """Update the feedback for a specific log ID."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE prediction_logs SET user_feedback = ? WHERE id = ?",
-        (feedback, log_id)
-    )
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "INSERT INTO prediction_logs (text, prediction, timestamp, stage) VALUES (?, ?, ?, ?)",
+            (text, prediction, datetime.now(), stage)
+        )
+        return cursor.lastrowid
 
+@db_timed
+def log_predictions(texts, predictions, stages=None) -> list:
+    """Log many predictions in a single transaction and return their log IDs in order."""
+    now = datetime.now()
+    texts = list(texts)
+    stages = stages if stages is not None else [None] * len(texts)
+    log_ids = []
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for text, prediction, stage in zip(texts, predictions, stages):
+            cursor.execute(
+                "INSERT INTO prediction_logs (text, prediction, timestamp, stage) VALUES (?, ?, ?, ?)",
+                (text, prediction, now, stage)
+            )
+            log_ids.append(cursor.lastrowid)
+    return log_ids
+
+@db_timed
+def reserve_log_ids(count: int) -> int:
+    """Reserve a block of `count` prediction log IDs and return the first one.
+
+    Bumps the AUTOINCREMENT sequence inside an IMMEDIATE transaction, so blocks
+    handed to different worker processes never overlap and rows logged through
+    `log_prediction` are numbered after every reserved block.
+    """
+    with get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'prediction_logs'").fetchone()
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM prediction_logs").fetchone()[0]
+        first_id = max(row[0] if row else 0, max_id) + 1
+        last_id = first_id + count - 1
+        if row:
+            conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'prediction_logs'", (last_id,))
+        else:
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('prediction_logs', ?)", (last_id,))
+    return first_id
+
+@db_timed
+def write_prediction_logs(records):
+    """Insert (id, text, prediction, timestamp, stage) rows with pre-reserved IDs in one transaction."""
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO prediction_logs (id, text, prediction, timestamp, stage) VALUES (?, ?, ?, ?, ?)",
+            records
+        )
+
+@db_timed
+def update_feedback(log_id: int, feedback: str) -> bool:
+    """Update the feedback for a specific log ID. Returns False if no such log exists."""
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "UPDATE prediction_logs SET user_feedback = ? WHERE id = ?",
+            (feedback, log_id)
+        )
+        return cursor.rowcount > 0
+
+@db_timed
 def get_stats():
     """Get statistics for the dashboard."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Total requests
-    cursor.execute("SELECT COUNT(*) FROM prediction_logs")
-    total_requests = cursor.fetchone()[0]
-    
-    # Spam vs Ham
-    cursor.execute("SELECT prediction, COUNT(*) FROM prediction_logs GROUP BY prediction")
-    distribution = {row[0]: row[1] for row in cursor.fetchall()}
-    
-    # Correctness (based on feedback)
-    cursor.execute("SELECT user_feedback, COUNT(*) FROM prediction_logs WHERE user_feedback IS NOT NULL GROUP BY user_feedback")
-    feedback_stats = {row[0]: row[1] for row in cursor.fetchall()}
-    
-    conn.close()
-    
+    # Read from the rollup counters instead of scanning prediction_logs
+    with get_connection() as conn:
+        rows = conn.execute("SELECT kind, key, count FROM stats_counters WHERE count > 0").fetchall()
+
+    total_requests = 0
+    distribution = {}  # Spam vs Ham
+    feedback_stats = {}  # Correctness (based on feedback)
+    for kind, key, count in rows:
+        if kind == "total":
+            total_requests = count
+        elif kind == "prediction":
+            distribution[key] = count
+        elif kind == "feedback":
+            feedback_stats[key] = count
+
     return {
         "total_requests": total_requests,
         "distribution": distribution,
         "feedback_stats": feedback_stats
     }
 
+@db_timed
 def get_recent_logs(limit: int = 5):
     """Fetch recent prediction logs."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row # Allow accessing columns by name
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, text, prediction, timestamp, user_feedback FROM prediction_logs ORDER BY id DESC LIMIT ?",
-        (limit,)
-    )
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    with get_connection() as conn:
+        cursor = conn.execute(
+            "SELECT id, text, prediction, timestamp, user_feedback, stage FROM prediction_logs ORDER BY id DESC LIMIT ?",
+            (limit,)
+        )
+        columns = [c[0] for c in cursor.description]
+        rows = cursor.fetchall()
+    # Pooled connections are shared, so build dicts here rather than setting row_factory
+    return [dict(zip(columns, row)) for row in rows]
+
+LOG_COLUMNS = "id, text, prediction, timestamp, user_feedback, stage"
 
+@db_timed
+def browse_logs(limit: int = 50, before=None, prediction: str = None, feedback: str = None,
+                since: datetime = None, until: datetime = None):
+    """Fetch prediction logs newest first, one keyset page at a time.
+
+    `before` is the (timestamp, id) of the last row of the previous page, so
+    each page is an index range scan however deep it is. `feedback` may be
+    'none' for rows without feedback. `since` is inclusive, `until` exclusive.
+    """
+    clauses, params = [], []
+    if before is not None:
+        clauses.append("(timestamp, id) < (?, ?)")
+        params.extend(before)
+    if prediction is not None:
+        clauses.append("prediction = ?")
+        params.append(prediction)
+    if feedback == "none":
+        clauses.append("user_feedback IS NULL")
+    elif feedback is not None:
+        clauses.append("user_feedback = ?")
+        params.append(feedback)
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("timestamp < ?")
+        params.append(until)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with get_connection() as conn:
+        cursor = conn.execute(
+            f"SELECT {LOG_COLUMNS} FROM prediction_logs {where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+            (*params, limit)
+        )
+        columns = [c[0] for c in cursor.description]
+        rows = cursor.fetchall()
+    return [dict(zip(columns, row)) for row in rows]
+
+@db_timed
+def fetch_logs_before(cutoff, limit: int):
+    """Oldest rows with a timestamp before `cutoff`, as tuples in LOG_COLUMNS order."""
+    with get_connection() as conn:
+        return conn.execute(
+            f"SELECT {LOG_COLUMNS} FROM prediction_logs WHERE timestamp < ? ORDER BY timestamp LIMIT ?",
+            (cutoff, limit)
+        ).fetchall()
+
+@db_timed
+def delete_logs(ids) -> int:
+    """Delete rows by ID. The stats rollups keep counting them (see app/retention.py)."""
+    with get_connection() as conn:
+        return conn.executemany("DELETE FROM prediction_logs WHERE id = ?", [(i,) for i in ids]).rowcount
+
+@db_timed
 def get_daily_stats(days: int = 7):
     """Fetch prediction counts grouped by date for the last N days."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT DATE(timestamp) as date, prediction, COUNT(*) as count 
-        FROM prediction_logs 
-        WHERE timestamp >= date('now', ?) 
-        GROUP BY date, prediction 
-        ORDER BY date ASC
-    ''', (f'-{days} days',))
-    rows = cursor.fetchall()
-    conn.close()
-    
+    with get_connection() as conn:
+        rows = conn.execute('''
+            SELECT date, prediction, count
+            FROM stats_daily
+            WHERE date >= date('now', ?) AND count > 0
+            ORDER BY date ASC
+        ''', (f'-{days} days',)).fetchall()
+
     # Process into structured format
     stats = {} # { "YYYY-MM-DD": {"Spam": 0, "Ham": 0} }
     for date, pred, count in rows:
         if date not in stats: stats[date] = {"Spam": 0, "Ham": 0}
         stats[date][pred] = count
-        
+
     return stats
 
+@db_timed
 def clear_all_logs():
     """Clear all prediction logs (Admin function)."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM prediction_logs")
-    # Reset Sequence? Optional but good for demo
-    cursor.execute("DELETE FROM sqlite_sequence WHERE name='prediction_logs'")
-    conn.commit()
-    conn.close()
-
-# Initialize DB on import (or you can call it explicitly in startup)
-init_db()
+    with get_connection() as conn:
+        conn.execute("DELETE FROM prediction_logs")
+        # Reset the rollups in the same transaction so they never disagree
+        conn.execute("UPDATE stats_counters SET count = 0 WHERE kind = 'total'")
+        conn.execute("DELETE FROM stats_counters WHERE kind != 'total'")
+        conn.execute("DELETE FROM stats_daily")
+        # The ID sequence is kept: the log writer hands out IDs before rows are
+        # written, so resetting it could give a new row an ID already returned
+        # to a client (and its feedback would land on the wrong message).
+
+@db_timed
+def save_prediction_cache(rows):
+    """Persist (key, prediction, model_version, expires_at) cached predictions in one transaction."""
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO prediction_cache (key, prediction, model_version, expires_at) VALUES (?, ?, ?, ?)",
+            rows
+        )
+
+@db_timed
+def load_prediction_cache(model_version: str, now: float, limit: int):
+    """Fetch unexpired cached predictions for a model version, newest first."""
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT key, prediction, expires_at FROM prediction_cache WHERE model_version = ? AND expires_at > ? ORDER BY expires_at DESC LIMIT ?",
+            (model_version, now, limit)
+        ).fetchall()
+    # Oldest first, so the newest entries end up most recently used in the LRU
+    return list(reversed(rows))
+
+@db_timed
+def clear_prediction_cache(keep_version: str = None):
+    """Delete cached predictions, optionally keeping those of one model version."""
+    with get_connection() as conn:
+        if keep_version is None:
+            conn.execute("DELETE FROM prediction_cache")
+        else:
+            conn.execute(
+                "DELETE FROM prediction_cache WHERE model_version != ? OR expires_at <= ?",
+                (keep_version, datetime.now().timestamp())
+            )
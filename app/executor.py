@@ -0,0 +1,52 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Inference executor settings (override through the environment)
+INFERENCE_WORKERS = int(os.environ.get("SPAM_INFERENCE_WORKERS", "1"))
+INFERENCE_MAX_PENDING = int(os.environ.get("SPAM_INFERENCE_MAX_PENDING", "64"))
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference queue is at capacity and a request must be shed."""
+
+
+class InferenceExecutor:
+    """Runs blocking tokenizer/model calls on a dedicated, bounded thread pool.
+
+    Keeps the asyncio event loop free for other requests while a forward pass
+    runs. At most `max_pending` jobs (running plus queued) are accepted; beyond
+    that `run` raises `InferenceQueueFull` instead of letting latency grow.
+    """
+
+    def __init__(self, max_workers=INFERENCE_WORKERS, max_pending=INFERENCE_MAX_PENDING):
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(1, int(max_pending))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        # Only touched from the event loop thread, so no lock is needed
+        self.pending = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` on the pool and await its result."""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise InferenceQueueFull("Inference queue is full")
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, partial(fn, *args, **kwargs))
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,223 @@
+import os
+import threading
+from collections import deque
+import time
+from datetime import datetime
+
+from app.database import reserve_log_ids, write_prediction_logs
+
+# Buffered log writer settings (override through the environment)
+LOG_BATCH_SIZE = int(os.environ.get("SPAM_LOG_BATCH_SIZE", "256"))
+LOG_FLUSH_INTERVAL_MS = float(os.environ.get("SPAM_LOG_FLUSH_INTERVAL_MS", "100"))
+LOG_MAX_PENDING = int(os.environ.get("SPAM_LOG_MAX_PENDING", "10000"))
+LOG_ID_BLOCK = int(os.environ.get("SPAM_LOG_ID_BLOCK", "1000"))
+LOG_WRITE_RETRIES = int(os.environ.get("SPAM_LOG_WRITE_RETRIES", "3"))
+
+
+class PredictionLogWriter:
+    """Buffers prediction log rows and writes them to `prediction_logs` in batches.
+
+    `log` returns the row's ID immediately: IDs come from blocks reserved with
+    `reserve_log_ids`, so no commit is needed to know them. The background
+    thread reserves the next block before the current one runs out, so `log`
+    does not touch SQLite unless a burst uses up both blocks. The thread
+    flushes the buffer in one transaction whenever `batch_size` rows are waiting
+    or `flush_interval_ms` has passed. Rows that arrive while `max_pending`
+    rows are already buffered are dropped and counted, and get no ID (None).
+    A batch whose write fails is retried up to `write_retries` times before
+    its rows are counted as failed.
+    """
+
+    def __init__(self, batch_size=LOG_BATCH_SIZE, flush_interval_ms=LOG_FLUSH_INTERVAL_MS,
+                 max_pending=LOG_MAX_PENDING, id_block=LOG_ID_BLOCK, write_retries=LOG_WRITE_RETRIES):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.001, flush_interval_ms / 1000.0)
+        self.max_pending = max(1, max_pending)
+        self.id_block = max(1, id_block)
+        self.write_retries = max(0, write_retries)
+
+        self._buffer = []
+        self._reserved = 0  # buffer slots claimed by log_many calls still allocating IDs
+        self._unwritten = set()  # IDs handed out but not yet committed
+        self._cond = threading.Condition()
+        self._id_lock = threading.Lock()
+        self._id_ranges = deque()  # reserved [first, last] ID ranges not handed out yet
+        self._ids_available = 0
+        self._refill_requested = False
+        self._enqueued = 0
+        self._done = 0
+        self._stopping = False
+        self._flush_requested = False
+        self._thread = None
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.id_stalls = 0  # allocations that had to reserve IDs on the caller's thread
+
+    def start(self):
+        if self._thread is None:
+            self._stopping = False
+            self._refill_ids()
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Write everything still buffered, then stop the background thread."""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._thread = None
+
+    def _reserve_block(self, count):
+        first_id = reserve_log_ids(count)
+        with self._id_lock:
+            self._id_ranges.append([first_id, first_id + count - 1])
+            self._ids_available += count
+
+    def _refill_ids(self):
+        """Keep at least one spare block reserved. Runs on the writer thread."""
+        with self._id_lock:
+            low = self._ids_available < self.id_block
+        if low:
+            self._reserve_block(self.id_block)
+
+    def _allocate_ids(self, count):
+        while True:
+            with self._id_lock:
+                short = count - self._ids_available
+                if short <= 0:
+                    ids = self._take_ids(count)
+                    refill = self._ids_available < self.id_block
+                    break
+            # Both blocks used up before the writer thread could refill them
+            self.id_stalls += 1
+            self._reserve_block(max(self.id_block, short))
+        if refill:
+            with self._cond:
+                self._refill_requested = True
+                self._cond.notify_all()
+        return ids
+
+    def _take_ids(self, count):
+        # Caller holds _id_lock and has checked that `count` IDs are available
+        ids = []
+        while len(ids) < count:
+            block = self._id_ranges[0]
+            take = min(count - len(ids), block[1] - block[0] + 1)
+            ids.extend(range(block[0], block[0] + take))
+            block[0] += take
+            if block[0] > block[1]:
+                self._id_ranges.popleft()
+        self._ids_available -= count
+        return ids
+
+    def log(self, text, prediction, stage=None):
+        """Queue one prediction and return its log ID (None if the buffer is full)."""
+        return self.log_many([text], [prediction], [stage])[0]
+
+    def log_many(self, texts, predictions, stages=None):
+        """Queue several predictions and return their log IDs in order.
+
+        Rows beyond the buffer's free space are dropped and get None instead
+        of an ID, so a client is never handed the ID of a row that will not exist.
+        """
+        texts = list(texts)
+        stages = stages if stages is not None else [None] * len(texts)
+        with self._cond:
+            accepted = max(0, min(len(texts), self.max_pending - len(self._buffer) - self._reserved))
+            self._reserved += accepted
+            self.dropped += len(texts) - accepted
+        try:
+            ids = self._allocate_ids(accepted) if accepted else []
+        except Exception:
+            with self._cond:
+                self._reserved -= accepted
+            raise
+        now = datetime.now()
+        with self._cond:
+            self._reserved -= accepted
+            for log_id, text, prediction, stage in zip(ids, texts, predictions, stages):
+                self._buffer.append((log_id, text, prediction, now, stage))
+                self._unwritten.add(log_id)
+                self._enqueued += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        return ids + [None] * (len(texts) - accepted)
+
+    def is_pending(self, log_id):
+        """True if the row was handed out but has not been committed yet."""
+        with self._cond:
+            return log_id in self._unwritten
+
+    def flush(self, timeout=None):
+        """Block until every row queued so far has been written (or has failed)."""
+        with self._cond:
+            target = self._enqueued
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._done >= target or self._thread is None, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: (self._stopping or self._flush_requested or self._refill_requested
+                             or len(self._buffer) >= self.batch_size),
+                    self.flush_interval
+                )
+                self._flush_requested = False
+                refill, self._refill_requested = self._refill_requested, False
+                batch, self._buffer = self._buffer, []
+                stopping = self._stopping
+
+            if refill:
+                try:
+                    self._refill_ids()
+                except Exception as e:
+                    print(f"Failed to reserve prediction log IDs: {e}")
+            if not batch:
+                if stopping:
+                    return
+                continue
+
+            ok = False
+            for attempt in range(self.write_retries + 1):
+                try:
+                    write_prediction_logs(batch)
+                    ok = True
+                    break
+                except Exception as e:
+                    print(f"Failed to write {len(batch)} prediction logs (attempt {attempt + 1}): {e}")
+                    if attempt < self.write_retries:
+                        time.sleep(self.flush_interval * (attempt + 1))
+
+            with self._cond:
+                if ok:
+                    self.written += len(batch)
+                else:
+                    self.failed += len(batch)
+                self.flushes += 1
+                self._done += len(batch)
+                self._unwritten.difference_update(row[0] for row in batch)
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._buffer),
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "flushes": self.flushes,
+                "id_stalls": self.id_stalls,
+                "batch_size": self.batch_size,
+                "flush_interval_ms": self.flush_interval * 1000.0,
+            }
+
+
+log_writer = PredictionLogWriter()
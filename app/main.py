@@ -1,19 +1,74 @@
-from fastapi import FastAPI, HTTPException, Depends, Security
+from fastapi import FastAPI, HTTPException, Depends, Security, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security.api_key import APIKeyHeader
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from app.model_loader import load_model, predict_sms
-from app.database import log_prediction, update_feedback, get_stats, create_api_key, check_api_key_valid, get_recent_logs, get_daily_stats, clear_all_logs
+from typing import List, Optional
+from app.model_loader import (load_model, predict_batch, configure_torch_threads, encoding_cache, get_model_version,
+                              import_inference_libs, warm_up, tokenize, length_buckets, predict_encoded)
+from app.result_cache import result_cache
+from app.batching import MicroBatcher
+from app.executor import InferenceExecutor, InferenceQueueFull
+from app.log_writer import log_writer
+from app.cascade import load_first_stage
+from app.stats_stream import stats_broadcaster
+from app.retention import log_retention
+from app.auth_cache import api_key_cache
+from app import metrics
+from app.metrics import (STAGE_SECONDS, HTTP_REQUESTS, HTTP_SECONDS, HTTP_ERRORS, PREDICTIONS, STARTUP_SECONDS, Gauge,
+                         CollectedCounter)
+from app.database import (get_pool, update_feedback, get_stats, create_api_key, deactivate_api_key, get_recent_logs,
+                          get_daily_stats, clear_all_logs, browse_logs, log_predictions)
+from contextlib import contextmanager
+from datetime import datetime
+import asyncio
+import base64
+import json
 import os
+import time
+
+# Log browsing page size limit
+LOGS_MAX_PAGE = 500
+
+# Bulk classification limits
+BATCH_MAX_TEXTS = int(os.environ.get("SPAM_BATCH_MAX_TEXTS", "10000"))
+BATCH_BUCKET_SIZE = int(os.environ.get("SPAM_BATCH_BUCKET_SIZE", "32"))
+BATCH_TOKENIZE_CHUNK = 1024
+
+# Load the model after the server starts listening, so /healthz answers while
+# it loads and /readyz tells the load balancer when to send traffic
+BACKGROUND_LOAD = os.environ.get("SPAM_BACKGROUND_LOAD", "1") == "1"
 
 app = FastAPI(title="SMS Spam Detector")
 
+def route_label(request):
+    # Label by route template (e.g. /feedback/{log_id}) to keep cardinality bounded
+    route = request.scope.get("route")
+    return route.path if route is not None else "static"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        HTTP_ERRORS.inc(route_label(request))
+        raise
+    path = route_label(request)
+    HTTP_SECONDS.observe(time.perf_counter() - started, request.method, path)
+    HTTP_REQUESTS.inc(request.method, path, str(response.status_code))
+    if response.status_code >= 500:
+        HTTP_ERRORS.inc(path)
+    return response
+
 # API Security
 API_KEY_NAME = "x-api-key"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 
 async def verify_api_key(api_key: str = Security(api_key_header)):
-    if api_key and check_api_key_valid(api_key):
+    with STAGE_SECONDS.time("auth"):
+        valid = bool(api_key) and api_key_cache.is_valid(api_key)
+    if valid:
         return api_key
     raise HTTPException(status_code=403, detail="Could not validate credentials")
 
@@ -21,45 +76,238 @@ async def verify_api_key(api_key: str = Security(api_key_header)):
 model = None
 tokenizer = None
 device = None
+batcher = None
+executor = None
+first_stage = None
+
+# Startup state reported by /healthz and /readyz
+ready = False
+startup_error = None
+startup_phases = {}
 
 class SMSRequest(BaseModel):
     text: str
 
+class BatchSMSRequest(BaseModel):
+    texts: List[str]
+
 class FeedbackRequest(BaseModel):
     feedback: str
 
+@contextmanager
+def startup_phase(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_phases[name] = round(time.perf_counter() - started, 4)
+        STARTUP_SECONDS.set(startup_phases[name], name)
+
+def load_and_warm_up():
+    """Blocking part of startup; runs in a worker thread."""
+    global model, tokenizer, device, first_stage
+    with startup_phase("database"):
+        get_pool()
+    with startup_phase("imports"):
+        import_inference_libs()
+        configure_torch_threads()
+    with startup_phase("model"):
+        loaded_model, loaded_tokenizer, loaded_device = load_model()
+    with startup_phase("filter"):
+        first_stage = load_first_stage()
+    with startup_phase("warmup"):
+        passes = warm_up(loaded_model, loaded_tokenizer, loaded_device)
+    print(f"Ran {passes} warm-up forward passes in {startup_phases['warmup']:.2f}s")
+    model, tokenizer, device = loaded_model, loaded_tokenizer, loaded_device
+
+async def load_service():
+    global batcher, executor, ready, startup_error
+    try:
+        with startup_phase("total"):
+            await asyncio.to_thread(load_and_warm_up)
+            result_cache.set_model_version(get_model_version())
+            executor = InferenceExecutor()
+            batcher = MicroBatcher(lambda texts: predict_batch(model, tokenizer, device, texts), executor=executor)
+            await batcher.start()
+        ready = True
+        print(f"Service ready: {startup_phases}")
+    except Exception as e:
+        startup_error = str(e)
+        print(f"Startup failed: {e}")
+        if not BACKGROUND_LOAD:
+            raise
+
 @app.on_event("startup")
 async def startup_event():
-    global model, tokenizer, device
-    model, tokenizer, device = load_model()
+    log_writer.start()
+    result_cache.start()
+    log_retention.start()
+    if BACKGROUND_LOAD:
+        app.state.load_task = asyncio.create_task(load_service())
+    else:
+        await load_service()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    load_task = getattr(app.state, "load_task", None)
+    if load_task and not load_task.done():
+        load_task.cancel()
+    if batcher:
+        await batcher.stop()
+    if executor:
+        executor.shutdown()
+    await stats_broadcaster.stop()
+    await asyncio.to_thread(log_retention.stop)
+    # Write any buffered prediction logs and cached predictions before exiting
+    await asyncio.to_thread(log_writer.stop)
+    await asyncio.to_thread(result_cache.stop)
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is serving requests (the model may still be loading)."""
+    if startup_error:
+        raise HTTPException(status_code=503, detail=f"Startup failed: {startup_error}")
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: the model is loaded and warmed up. Includes startup phase timings in seconds."""
+    body = {"ready": ready, "phases": startup_phases}
+    if not ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+def queue_full_error():
+    return HTTPException(status_code=503, detail="Inference queue is full, retry later", headers={"Retry-After": "1"})
 
 @app.post("/auth/generate-key")
 async def generate_api_key():
     """Generate a new API key."""
     try:
         new_key = create_api_key()
+        api_key_cache.invalidate(new_key)
         return {"api_key": new_key}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/auth/revoke-key")
+async def revoke_api_key(api_key: str = Depends(verify_api_key)):
+    """Deactivate the API key used to make this request."""
+    try:
+        deactivate_api_key(api_key)
+        api_key_cache.invalidate(api_key)
+        return {"status": "revoked"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def run_first_stage(texts):
+    """First-stage filter decisions ('Spam', 'Ham' or None to defer to BERT)."""
+    if first_stage is None:
+        return [None] * len(texts)
+    with STAGE_SECONDS.time("filter"):
+        return first_stage.decide_many(texts)
+
+async def predict_bulk(texts):
+    """Length-bucketed prediction as one executor job per chunk and bucket.
+
+    Small jobs let /predict micro-batches run between the buckets of a large
+    request instead of waiting for the whole request.
+    """
+    encoded = []
+    for start in range(0, len(texts), BATCH_TOKENIZE_CHUNK):
+        encoded.extend(await executor.run(tokenize, tokenizer, texts[start:start + BATCH_TOKENIZE_CHUNK]))
+    results = [None] * len(texts)
+    for bucket in length_buckets(encoded, BATCH_BUCKET_SIZE):
+        labels = await executor.run(predict_encoded, model, tokenizer, device, [encoded[i] for i in bucket])
+        for i, label in zip(bucket, labels):
+            results[i] = label
+    return results
+
 @app.post("/predict")
 async def predict(request: SMSRequest, api_key: str = Depends(verify_api_key)):
-    if not model:
-        raise HTTPException(status_code=503, detail="Model not loaded")
+    if not ready:
+        raise HTTPException(status_code=503, detail="Model not loaded", headers={"Retry-After": "1"})
     
     try:
-        result = predict_sms(model, tokenizer, device, request.text)
-        # Log to DB
-        log_id = log_prediction(request.text, result)
-        return {"prediction": result, "log_id": log_id}
+        # Cascade: result cache, then the cheap first-stage filter, then BERT
+        result, stage = result_cache.get(request.text), "cache"
+        if result is None:
+            result, stage = run_first_stage([request.text])[0], "filter"
+        if result is None:
+            result, stage = await batcher.submit(request.text), "bert"
+            result_cache.put(request.text, result)
+        PREDICTIONS.inc(result, stage)
+        # Log to DB (buffered; the ID is valid before the row is committed)
+        log_id = log_writer.log(request.text, result, stage)
+        stats_broadcaster.notify()
+        return {"prediction": result, "log_id": log_id, "stage": stage}
+    except InferenceQueueFull:
+        raise queue_full_error()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/predict/batch")
+async def predict_batch_endpoint(request: BatchSMSRequest, api_key: str = Depends(verify_api_key)):
+    """Classify many messages at once; results are returned in input order."""
+    if not ready:
+        raise HTTPException(status_code=503, detail="Model not loaded", headers={"Retry-After": "1"})
+    if len(request.texts) > BATCH_MAX_TEXTS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_TEXTS} texts per request")
+    if not request.texts:
+        return {"results": []}
+
+    try:
+        cached = [result_cache.get(text) for text in request.texts]
+        # Only classify distinct texts the cache could not answer
+        missing = list(dict.fromkeys(text for text, result in zip(request.texts, cached) if result is None))
+        fresh = {}  # text -> (prediction, stage)
+        if missing:
+            if first_stage is not None:
+                decided = await executor.run(run_first_stage, missing)
+                fresh = {text: (result, "filter") for text, result in zip(missing, decided) if result is not None}
+            deferred = [text for text in missing if text not in fresh]
+            if deferred:
+                for text, prediction in zip(deferred, await predict_bulk(deferred)):
+                    fresh[text] = (prediction, "bert")
+                    result_cache.put(text, prediction)
+        decisions = [fresh[text] if result is None else (result, "cache") for text, result in zip(request.texts, cached)]
+        for result, stage in decisions:
+            PREDICTIONS.inc(result, stage)
+        # Written directly in one transaction, off the event loop: a bulk request
+        # would fill the shared log buffer and get rows dropped under normal load
+        log_ids = await asyncio.to_thread(
+            log_predictions, request.texts, [d[0] for d in decisions], [d[1] for d in decisions]
+        )
+        stats_broadcaster.notify()
+        return {
+            "results": [
+                {"prediction": result, "log_id": log_id, "stage": stage}
+                for (result, stage), log_id in zip(decisions, log_ids)
+            ]
+        }
+    except InferenceQueueFull:
+        raise queue_full_error()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/feedback/{log_id}")
 async def submit_feedback(log_id: int, request: FeedbackRequest):
     try:
-        update_feedback(log_id, request.feedback)
+        if log_writer.is_pending(log_id):
+            # The row is still buffered; make sure it exists before updating it
+            await asyncio.to_thread(log_writer.flush, 5)
+        updated = update_feedback(log_id, request.feedback)
+        if not updated:
+            # The row may still be buffered in another worker process; wait for
+            # one flush interval of that worker's writer before giving up
+            await asyncio.sleep(log_writer.flush_interval)
+            updated = update_feedback(log_id, request.feedback)
+        if not updated:
+            raise HTTPException(status_code=404, detail="Log not found")
+        stats_broadcaster.notify()
         return {"status": "success"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -79,12 +327,154 @@ async def get_history():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/stats/stream")
+async def stream_stats(request: Request):
+    """Server-sent events: a `snapshot` of the dashboard stats, then `delta` events as they change."""
+    queue = await stats_broadcaster.subscribe()
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), 15.0)
+                except asyncio.TimeoutError:
+                    # Keep-alive comment so proxies do not close an idle stream
+                    yield ": ping\n\n"
+                    continue
+                if message is None:
+                    # The broadcaster stopped; closing makes EventSource reconnect
+                    break
+                yield message
+        finally:
+            stats_broadcaster.unsubscribe(queue)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+def encode_cursor(log):
+    return base64.urlsafe_b64encode(json.dumps([log["timestamp"], log["id"]]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        timestamp, log_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(timestamp), int(log_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_log_time(name, value):
+    """A `since`/`until` query value as a naive local datetime, the way log timestamps are stored."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be an ISO 8601 date or datetime")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+@app.get("/logs")
+async def list_logs(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    label: Optional[str] = None,
+    feedback: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    api_key: str = Depends(verify_api_key),
+):
+    """Browse prediction logs newest first. Pass `next_cursor` back as `cursor` for the next page.
+
+    Filters: `label` (Spam/Ham), `feedback` (a feedback value, or `none`), and
+    a `since` (inclusive) / `until` (exclusive) date or datetime range.
+    """
+    if not 1 <= limit <= LOGS_MAX_PAGE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {LOGS_MAX_PAGE}")
+    before = decode_cursor(cursor) if cursor else None
+    # Parsed rather than passed through: a raw "2026-01-01T10:00" string would
+    # compare wrongly against the stored "2026-01-01 10:00:00" timestamps
+    since = parse_log_time("since", since) if since else None
+    until = parse_log_time("until", until) if until else None
+    try:
+        logs = await asyncio.to_thread(browse_logs, limit, before, label, feedback, since, until)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    next_cursor = encode_cursor(logs[-1]) if len(logs) == limit else None
+    return {"logs": logs, "next_cursor": next_cursor}
+
+@app.get("/stats/retention")
+async def get_retention_stats():
+    """Log archival settings and progress."""
+    return log_retention.stats()
+
+@app.get("/stats/batching")
+async def get_batching_stats():
+    """Queue depth and batch-size histograms from the micro-batcher."""
+    if not batcher:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    stats = batcher.stats()
+    stats["executor"] = executor.stats()
+    return stats
+
+@app.get("/stats/log-writer")
+async def get_log_writer_stats():
+    """Buffered prediction-log writer counters, including dropped and failed rows."""
+    return log_writer.stats()
+
+@app.get("/stats/cache")
+async def get_cache_stats():
+    """Hit rates of the inference caches."""
+    return {"encoding": encoding_cache.stats(), "results": result_cache.stats(), "api_keys": api_key_cache.stats()}
+
+@app.get("/stats/memory")
+async def get_memory_stats():
+    """This worker's unique vs shared memory in bytes (shared includes preloaded model weights)."""
+    return {"pid": os.getpid(), "memory": metrics.read_memory()}
+
+# Component gauges and totals, refreshed from each component's stats() at scrape time
+BATCHER_QUEUE_DEPTH = Gauge("spam_batcher_queue_depth", "Requests waiting for a micro-batch.")
+BATCHER_REJECTED = CollectedCounter("spam_batcher_rejected_total", "Requests rejected because the batching queue was full.")
+EXECUTOR_PENDING = Gauge("spam_executor_pending", "Inference jobs running or queued on the executor.")
+EXECUTOR_REJECTED = CollectedCounter("spam_executor_rejected_total", "Inference jobs rejected because the executor was full.")
+CACHE_EVENTS = CollectedCounter("spam_cache_events_total", "Cache hits, misses, evictions and invalidations.", ["cache", "event"])
+CACHE_SIZE = Gauge("spam_cache_size", "Entries currently cached.", ["cache"])
+STREAM_SUBSCRIBERS = Gauge("spam_stats_stream_subscribers", "Open /stats/stream connections.")
+LOG_WRITER_PENDING = Gauge("spam_log_writer_pending", "Prediction log rows buffered but not yet written.")
+LOG_WRITER_ROWS = CollectedCounter("spam_log_writer_rows_total", "Prediction log rows by outcome.", ["state"])
+
+@metrics.register_collector
+def collect_component_stats():
+    if batcher:
+        stats = batcher.stats()
+        BATCHER_QUEUE_DEPTH.set(stats["queue_depth"])
+        BATCHER_REJECTED.set(stats["rejected"])
+    if executor:
+        stats = executor.stats()
+        EXECUTOR_PENDING.set(stats["pending"])
+        EXECUTOR_REJECTED.set(stats["rejected"])
+    for name, cache in (("encoding", encoding_cache), ("results", result_cache), ("api_keys", api_key_cache)):
+        stats = cache.stats()
+        CACHE_SIZE.set(stats["size"], name)
+        for event in ("hits", "misses", "evictions", "invalidations"):
+            if event in stats:
+                CACHE_EVENTS.set(stats[event], name, event)
+    STREAM_SUBSCRIBERS.set(stats_broadcaster.stats()["subscribers"])
+    stats = log_writer.stats()
+    LOG_WRITER_PENDING.set(stats["pending"])
+    for state in ("written", "dropped", "failed"):
+        LOG_WRITER_ROWS.set(stats[state], state)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """All service metrics in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.delete("/admin/logs")
 async def clear_logs_endpoint(api_key: str = Depends(verify_api_key)):
     # In a real app, this would check for ADMIN role, not just any key.
     # For this demo, any valid key user can text "Reset".
     try:
+        await asyncio.to_thread(log_writer.flush, 5)
         clear_all_logs()
+        stats_broadcaster.notify(reset=True)
         return {"status": "cleared"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
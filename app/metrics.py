@@ -0,0 +1,225 @@
+import bisect
+import functools
+import os
+import threading
+import time
+
+# Minimal Prometheus-compatible metrics. Each observation is a dict lookup, a
+# bisect and an increment under a lock, which is cheap enough to leave on.
+# Label values are passed positionally in the order of `labels`.
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_collectors = []
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class CollectedCounter(Gauge):
+    """A monotonic total kept by some component, copied in by a collector at scrape time.
+
+    Exported as a counter so rate() and increase() handle worker restarts; the
+    name should end in `_total`.
+    """
+    type = "counter"
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *label_values):
+        """Context manager observing the elapsed wall time of its block."""
+        return _Timer(self, label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._values.items())
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound) if bound != float("inf") else "+Inf"}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, label_values, le)} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "started")
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+
+
+def timed(histogram, *label_values):
+    """Decorator recording each call's duration in `histogram`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, *label_values)
+        return wrapper
+    return decorator
+
+
+def register_collector(fn):
+    """Register a callback run at scrape time, e.g. to copy component stats into gauges."""
+    _collectors.append(fn)
+    return fn
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    for collect in _collectors:
+        try:
+            collect()
+        except Exception as e:
+            print(f"Metrics collector {collect.__name__} failed: {e}")
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Service metrics ---
+
+STAGE_SECONDS = Histogram("spam_stage_seconds", "Latency of /predict pipeline stages.", ["stage"])
+DB_SECONDS = Histogram("spam_db_seconds", "Latency of app.database calls.", ["operation"])
+HTTP_REQUESTS = Counter("spam_http_requests_total", "HTTP requests by route and status.", ["method", "route", "status"])
+HTTP_SECONDS = Histogram("spam_http_request_seconds", "HTTP request latency by route.", ["method", "route"])
+HTTP_ERRORS = Counter("spam_http_errors_total", "HTTP responses with status >= 500, or unhandled exceptions.", ["route"])
+PREDICTIONS = Counter("spam_predictions_total", "Predictions served by label and deciding stage (cache, filter or bert).", ["label", "stage"])
+STARTUP_SECONDS = Gauge("spam_startup_phase_seconds", "Duration of each startup phase.", ["phase"])
+PROCESS_RSS_BYTES = Gauge("spam_process_resident_memory_bytes", "Resident set size of this worker.")
+PROCESS_CPU_SECONDS = CollectedCounter("spam_process_cpu_seconds_total", "User + system CPU time of this worker.")
+PROCESS_MEMORY_BYTES = Gauge(
+    "spam_process_memory_bytes",
+    "Worker memory: rss, unique (private pages), shared (pages shared with other processes, e.g. "
+    "preloaded model weights) and pss (shared pages divided among their sharers).",
+    ["kind"],
+)
+
+
+def db_timed(fn):
+    """Decorator for app.database functions."""
+    return timed(DB_SECONDS, fn.__name__)(fn)
+
+
+def read_memory(pid="self"):
+    """Unique vs shared memory of a process in bytes, from /proc/<pid>/smaps_rollup.
+
+    Returns None where smaps_rollup is unavailable (non-Linux, kernels < 4.14).
+    Summing `pss` over all workers gives their true combined footprint.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except OSError:
+        return None
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "unique": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+    }
+
+
+@register_collector
+def _collect_process():
+    try:
+        with open("/proc/self/statm") as f:
+            PROCESS_RSS_BYTES.set(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+    except OSError:
+        import resource
+        # ru_maxrss is the peak, which is the closest portable figure
+        PROCESS_RSS_BYTES.set(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+    memory = read_memory()
+    if memory is not None:
+        for kind, value in memory.items():
+            PROCESS_MEMORY_BYTES.set(value, kind)
+    times = os.times()
+    PROCESS_CPU_SECONDS.set(times.user + times.system)
@@ -1,48 +1,247 @@
-import torch
-from transformers import BertForSequenceClassification, BertTokenizer
+from app.metrics import STAGE_SECONDS
+from collections import OrderedDict
+import hashlib
+import threading
 import os
 
+# torch, transformers and app.backends are imported inside the functions that
+# need them, so importing this module (and app.main) stays cheap and the heavy
+# imports happen in the startup "imports" phase instead.
+
 # Define base paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-MODEL_PATH = os.path.join(BASE_DIR, "models", "bert_spam_model_weighted")
+# Any BertForSequenceClassification directory, e.g. a distilled student (scripts/distill_model.py)
+MODEL_PATH = os.environ.get("SPAM_MODEL_PATH", os.path.join(BASE_DIR, "models", "bert_spam_model_weighted"))
+if not os.path.isabs(MODEL_PATH):
+    MODEL_PATH = os.path.join(BASE_DIR, MODEL_PATH)
+
+MAX_LENGTH = 128
+
+# Inference backend: fp32, int8, onnx or onnx-int8 (see app/backends.py)
+INFERENCE_BACKEND = os.environ.get("SPAM_INFERENCE_BACKEND", "fp32")
+
+# Tokenizer settings
+USE_FAST_TOKENIZER = os.environ.get("SPAM_FAST_TOKENIZER", "1") == "1"
+ENCODING_CACHE_SIZE = int(os.environ.get("SPAM_ENCODING_CACHE_SIZE", "50000"))
+
+# Torch CPU threading (0 keeps torch's default)
+TORCH_INTRA_OP_THREADS = int(os.environ.get("SPAM_TORCH_INTRA_OP_THREADS", "0"))
+TORCH_INTER_OP_THREADS = int(os.environ.get("SPAM_TORCH_INTER_OP_THREADS", "0"))
+
+# Warm-up forward passes run at startup, one per (token length, batch size); empty disables
+WARMUP_LENGTHS = [int(n) for n in os.environ.get("SPAM_WARMUP_LENGTHS", "16,32,64,128").split(",") if n.strip()]
+WARMUP_BATCH_SIZES = [int(n) for n in os.environ.get("SPAM_WARMUP_BATCH_SIZES", "1,16").split(",") if n.strip()]
+
+def import_inference_libs():
+    """Imports torch, transformers and the model classes up front."""
+    import torch  # noqa: F401
+    import transformers  # noqa: F401
+    import app.backends  # noqa: F401
+
+def configure_torch_threads(intra_op=TORCH_INTRA_OP_THREADS, inter_op=TORCH_INTER_OP_THREADS):
+    """Sets torch intra-op and inter-op thread counts. Call before the first forward pass."""
+    import torch
+
+    if intra_op > 0:
+        torch.set_num_threads(intra_op)
+    if inter_op > 0:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as e:
+            # Can only be set once, before any inter-op parallel work has started
+            print(f"Could not set inter-op threads: {e}")
+
+def normalize_text(text):
+    """Collapses whitespace; BERT tokenization is identical for the normalized text."""
+    return " ".join(text.split())
+
+class EncodingCache:
+    """Bounded, thread-safe LRU cache of token ids keyed by normalized text."""
+
+    def __init__(self, max_size=ENCODING_CACHE_SIZE):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            ids = self._data.get(key)
+            if ids is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return ids
+
+    def put(self, key, ids):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = ids
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+encoding_cache = EncodingCache()
+
+def get_model_version(path=MODEL_PATH):
+    """Fingerprints the backend and model directory from file names, sizes and modification times."""
+    digest = hashlib.sha1(INFERENCE_BACKEND.encode("utf-8"))
+    for name in sorted(os.listdir(path)):
+        stat = os.stat(os.path.join(path, name))
+        digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+# (model, device) loaded by a preforking parent and inherited by its workers (see app/serve.py)
+_preloaded = None
+
+def preload_model():
+    """Loads the weights once in the parent process, before the workers are forked."""
+    global _preloaded
+    from app.backends import load_backend
+
+    print(f"Preloading model from {MODEL_PATH} ({INFERENCE_BACKEND} backend)...")
+    _preloaded = load_backend(MODEL_PATH, INFERENCE_BACKEND, TORCH_INTRA_OP_THREADS)
+    return _preloaded
 
 def load_model():
     """Loads the model and tokenizer."""
-    print(f"Loading model from {MODEL_PATH}...")
+    from app.backends import load_backend
+
+    if _preloaded is not None:
+        print("Using model weights shared by the parent process.")
+    else:
+        print(f"Loading model from {MODEL_PATH} ({INFERENCE_BACKEND} backend)...")
     try:
-        model = BertForSequenceClassification.from_pretrained(MODEL_PATH)
-        tokenizer = BertTokenizer.from_pretrained(MODEL_PATH)
-        
-        # Move to device
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        model.to(device)
-        model.eval()
-        
+        model, device = _preloaded or load_backend(MODEL_PATH, INFERENCE_BACKEND, TORCH_INTRA_OP_THREADS)
+        tokenizer = load_tokenizer(MODEL_PATH)
+
         print("Model loaded successfully.")
         return model, tokenizer, device
     except Exception as e:
         print(f"Error loading model: {e}")
         raise e
 
+def load_tokenizer(path):
+    """Loads the Rust-backed fast tokenizer from the model's vocab, falling back to the Python one."""
+    from transformers import BertTokenizer, BertTokenizerFast
+
+    if USE_FAST_TOKENIZER:
+        try:
+            return BertTokenizerFast.from_pretrained(path)
+        except Exception as e:
+            print(f"Fast tokenizer unavailable ({e}), using BertTokenizer.")
+    return BertTokenizer.from_pretrained(path)
+
+# The Rust fast tokenizer is not re-entrant: concurrent calls that set
+# truncation raise "RuntimeError: Already borrowed" (huggingface/tokenizers#537),
+# so with several inference workers the shared tokenizer is called under a lock
+_tokenizer_lock = threading.Lock()
+
+def encode_texts(tokenizer, texts):
+    """Returns unpadded input ids for each text, batch-encoding only cache misses."""
+    keys = [normalize_text(text) for text in texts]
+    encoded = [encoding_cache.get(key) for key in keys]
+
+    missing = [i for i, ids in enumerate(encoded) if ids is None]
+    if missing:
+        with _tokenizer_lock:
+            fresh = tokenizer(
+                [keys[i] for i in missing],
+                add_special_tokens=True,
+                max_length=MAX_LENGTH,
+                truncation=True,
+                return_attention_mask=False
+            )["input_ids"]
+        for i, ids in zip(missing, fresh):
+            encoded[i] = ids
+            encoding_cache.put(keys[i], ids)
+
+    return encoded
+
+def collate(tokenizer, encoded, device):
+    """Pads a list of input id lists to their longest member and builds the attention mask."""
+    import torch
+
+    max_len = max(len(ids) for ids in encoded)
+    input_ids = torch.full((len(encoded), max_len), tokenizer.pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(encoded), max_len), dtype=torch.long)
+    for row, ids in enumerate(encoded):
+        input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+        attention_mask[row, :len(ids)] = 1
+    return {"input_ids": input_ids.to(device), "attention_mask": attention_mask.to(device)}
+
 def predict_sms(model, tokenizer, device, sms_text):
     """Predicts if an SMS is Spam or Ham."""
-    inputs = tokenizer.encode_plus(
-        sms_text,
-        add_special_tokens=True,
-        max_length=128,
-        pad_to_max_length=True,
-        return_attention_mask=True,
-        truncation=True,
-        return_tensors="pt"
-    )
-    
-    # Move inputs to device
-    inputs = {key: val.to(device) for key, val in inputs.items()}
-    
-    with torch.no_grad():
+    return predict_batch(model, tokenizer, device, [sms_text])[0]
+
+def predict_batch(model, tokenizer, device, texts):
+    """Predicts Spam/Ham for a list of SMS texts in a single forward pass."""
+    import torch
+
+    with STAGE_SECONDS.time("tokenize"):
+        inputs = collate(tokenizer, encode_texts(tokenizer, texts), device)
+
+    with STAGE_SECONDS.time("forward"), torch.no_grad():
+        outputs = model(**inputs)
+
+    predictions = torch.argmax(outputs.logits, dim=1).tolist()
+    return ["Spam" if p == 1 else "Ham" for p in predictions]
+
+def tokenize(tokenizer, texts):
+    """Unpadded input ids for each text (see encode_texts), timed as the tokenize stage."""
+    with STAGE_SECONDS.time("tokenize"):
+        return encode_texts(tokenizer, list(texts))
+
+def length_buckets(encoded, bucket_size=32):
+    """Indices into `encoded` sorted by token length and split into buckets of `bucket_size`."""
+    order = sorted(range(len(encoded)), key=lambda i: len(encoded[i]))
+    return [order[start:start + bucket_size] for start in range(0, len(order), bucket_size)]
+
+def predict_encoded(model, tokenizer, device, encoded):
+    """Predicts Spam/Ham for already tokenized texts in one forward pass padded to their longest member."""
+    import torch
+
+    inputs = collate(tokenizer, encoded, device)
+    with STAGE_SECONDS.time("forward"), torch.no_grad():
         outputs = model(**inputs)
-    
-    logits = outputs.logits
-    prediction = torch.argmax(logits, dim=1).item()
-    
-    return "Spam" if prediction == 1 else "Ham"
+    predictions = torch.argmax(outputs.logits, dim=1).tolist()
+    return ["Spam" if p == 1 else "Ham" for p in predictions]
+
+def warm_up(model, tokenizer, device, lengths=WARMUP_LENGTHS, batch_sizes=WARMUP_BATCH_SIZES):
+    """Runs forward passes over typical shapes so lazy kernel initialization and
+    allocator growth happen before the first real request. Returns the number of passes."""
+    import torch
+
+    # The tokenizer has one-off setup costs of its own; its output is not cached
+    with _tokenizer_lock:
+        tokenizer(["warm up"], add_special_tokens=True, return_attention_mask=False)
+    passes = 0
+    for length in lengths:
+        length = min(max(length, 2), MAX_LENGTH)
+        ids = [tokenizer.cls_token_id] + [tokenizer.unk_token_id] * (length - 2) + [tokenizer.sep_token_id]
+        for batch_size in batch_sizes:
+            inputs = collate(tokenizer, [ids] * batch_size, device)
+            with torch.no_grad():
+                model(**inputs)
+            passes += 1
+    return passes
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.database import clear_prediction_cache, load_prediction_cache, save_prediction_cache
+from app.model_loader import normalize_text
+
+# Result cache settings (override through the environment)
+RESULT_CACHE_SIZE = int(os.environ.get("SPAM_RESULT_CACHE_SIZE", "100000"))
+RESULT_CACHE_TTL = float(os.environ.get("SPAM_RESULT_CACHE_TTL", "86400"))
+RESULT_CACHE_PERSIST = os.environ.get("SPAM_RESULT_CACHE_PERSIST", "0") == "1"
+RESULT_CACHE_SAVE_INTERVAL_MS = float(os.environ.get("SPAM_RESULT_CACHE_SAVE_INTERVAL_MS", "200"))
+
+
+class ResultCache:
+    """Content-addressed LRU + TTL cache of predictions.
+
+    Keys are a SHA-256 of the normalized text and the model version, so a new
+    model never serves results from an old one. With `persist` enabled entries
+    are saved to the `prediction_cache` table and reloaded on start. `put`
+    only queues them: a background thread (see `start`) saves everything
+    queued in one transaction every `save_interval_ms`, so request handlers
+    never wait on SQLite. At most `max_size` entries wait; beyond that they are
+    kept in memory only.
+    """
+
+    def __init__(self, max_size=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL, persist=RESULT_CACHE_PERSIST,
+                 save_interval_ms=RESULT_CACHE_SAVE_INTERVAL_MS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persist = persist
+        self.save_interval = max(0.001, save_interval_ms / 1000.0)
+        self.model_version = ""
+        self._data = OrderedDict()  # key -> (prediction, expires_at)
+        self._lock = threading.Lock()
+        self._unsaved = []  # (key, prediction, model_version, expires_at) rows waiting to be persisted
+        self._save_cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self.saved = 0
+        self.save_failed = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def key(self, text):
+        payload = f"{self.model_version}\0{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def set_model_version(self, version):
+        """Bind the cache to a model version, dropping entries from any other version."""
+        with self._lock:
+            changed = version != self.model_version
+            self.model_version = version
+            if changed:
+                self._data.clear()
+        if changed:
+            with self._save_cond:
+                self._unsaved.clear()
+        if self.persist:
+            clear_prediction_cache(keep_version=version)
+            now = time.time()
+            for key, prediction, expires_at in load_prediction_cache(version, now, self.max_size):
+                self._store(key, prediction, expires_at)
+
+    def get(self, text):
+        key = self.key(text)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self._data[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, text, prediction):
+        if self.max_size <= 0:
+            return
+        key = self.key(text)
+        expires_at = time.time() + self.ttl
+        self._store(key, prediction, expires_at)
+        if self.persist:
+            with self._save_cond:
+                if len(self._unsaved) < self.max_size:
+                    self._unsaved.append((key, prediction, self.model_version, expires_at))
+
+    def _store(self, key, prediction, expires_at):
+        with self._lock:
+            self._data[key] = (prediction, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        with self._save_cond:
+            self._unsaved.clear()
+        if self.persist:
+            clear_prediction_cache()
+
+    def start(self):
+        """Start the thread saving queued entries (only when persisting)."""
+        if self.persist and self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="result-cache-saver", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Save everything still queued, then stop the thread."""
+        if self._thread is None:
+            return
+        with self._save_cond:
+            self._stopping = True
+            self._save_cond.notify_all()
+        self._thread.join()
+        self._thread = None
+
+    def save_pending(self):
+        """Write every queued entry in one transaction. Returns the number written."""
+        with self._save_cond:
+            rows, self._unsaved = self._unsaved, []
+        if not rows:
+            return 0
+        try:
+            save_prediction_cache(rows)
+        except Exception as e:
+            # Losing persisted entries only costs a recomputation after a restart
+            print(f"Failed to persist {len(rows)} cached predictions: {e}")
+            self.save_failed += len(rows)
+            return 0
+        self.saved += len(rows)
+        return len(rows)
+
+    def _run(self):
+        while True:
+            with self._save_cond:
+                self._save_cond.wait_for(lambda: self._stopping, self.save_interval)
+                stopping = self._stopping
+            self.save_pending()
+            if stopping:
+                return
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "persist": self.persist,
+            "unsaved": len(self._unsaved),
+            "saved": self.saved,
+            "save_failed": self.save_failed,
+            "model_version": self.model_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+result_cache = ResultCache()
@@ -0,0 +1,136 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.database import LOG_COLUMNS, delete_logs, fetch_logs_before
+
+# Retention settings (override through the environment)
+RETENTION_DAYS = float(os.environ.get("SPAM_RETENTION_DAYS", "0"))  # 0 keeps logs forever
+RETENTION_INTERVAL = float(os.environ.get("SPAM_RETENTION_INTERVAL", "3600"))
+RETENTION_BATCH_SIZE = int(os.environ.get("SPAM_RETENTION_BATCH_SIZE", "500"))
+RETENTION_PAUSE_MS = float(os.environ.get("SPAM_RETENTION_PAUSE_MS", "50"))
+ARCHIVE_DB_PATH = os.environ.get("SPAM_ARCHIVE_DB_PATH", "spam_detection_archive.db")
+
+# Moves prediction_logs rows older than the retention age into an archive
+# database, in small batches. Each batch is one short transaction on the archive
+# and then one on the live database, with a pause between batches so request
+# writers never wait behind a long lock. The archive is committed first and uses
+# INSERT OR IGNORE, so a run interrupted between the two steps is finished by
+# the next run without duplicates, and several workers can run it at once.
+#
+# The stats rollups have no delete trigger, so archived rows stay counted in
+# /stats and /stats/history; only clear_all_logs resets them.
+
+
+def open_archive(path=ARCHIVE_DB_PATH):
+    conn = sqlite3.connect(path, timeout=30.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS prediction_logs (
+            id INTEGER PRIMARY KEY,
+            text TEXT NOT NULL,
+            prediction TEXT NOT NULL,
+            timestamp DATETIME,
+            user_feedback TEXT,
+            stage TEXT,
+            archived_at DATETIME
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_prediction_logs_timestamp ON prediction_logs (timestamp)")
+    conn.commit()
+    return conn
+
+
+def archive_old_logs(max_age_days=RETENTION_DAYS, batch_size=RETENTION_BATCH_SIZE,
+                     pause_ms=RETENTION_PAUSE_MS, archive_path=ARCHIVE_DB_PATH, stop_event=None):
+    """Archive and delete every row older than `max_age_days`. Returns the number of rows moved."""
+    cutoff = datetime.now() - timedelta(days=max_age_days)
+    archive = open_archive(archive_path)
+    moved = 0
+    try:
+        while stop_event is None or not stop_event.is_set():
+            rows = fetch_logs_before(cutoff, batch_size)
+            if not rows:
+                break
+            now = datetime.now()
+            with archive:
+                archive.executemany(
+                    f"INSERT OR IGNORE INTO prediction_logs ({LOG_COLUMNS}, archived_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(*row, now) for row in rows]
+                )
+            delete_logs([row[0] for row in rows])
+            moved += len(rows)
+            time.sleep(pause_ms / 1000.0)
+    finally:
+        archive.close()
+    return moved
+
+
+class LogRetention:
+    """Background thread running `archive_old_logs` every `interval` seconds."""
+
+    def __init__(self, max_age_days=RETENTION_DAYS, interval=RETENTION_INTERVAL):
+        self.max_age_days = max_age_days
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.archived = 0
+        self.last_run = None
+        self.last_error = None
+
+    def start(self):
+        if self.max_age_days > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="log-retention", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.archived += archive_old_logs(self.max_age_days, stop_event=self._stop)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Log retention run failed: {e}")
+            self.runs += 1
+            self.last_run = datetime.now().isoformat(timespec="seconds")
+            self._stop.wait(self.interval)
+
+    def stats(self):
+        return {
+            "enabled": self.max_age_days > 0,
+            "max_age_days": self.max_age_days,
+            "interval_seconds": self.interval,
+            "archive_path": ARCHIVE_DB_PATH,
+            "runs": self.runs,
+            "archived": self.archived,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+        }
+
+
+log_retention = LogRetention()
+
+
+if __name__ == "__main__":
+    # One-off run, e.g. from cron: python -m app.retention --days 90
+    parser = argparse.ArgumentParser(description="Archive prediction logs older than a given age.")
+    parser.add_argument("--days", type=float, default=RETENTION_DAYS or 90)
+    parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE)
+    parser.add_argument("--pause-ms", type=float, default=RETENTION_PAUSE_MS)
+    parser.add_argument("--archive", default=ARCHIVE_DB_PATH)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    count = archive_old_logs(args.days, args.batch_size, args.pause_ms, args.archive)
+    print(f"Archived {count} prediction logs older than {args.days:g} days to {args.archive} "
+          f"in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,135 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+# Preforking server with shared model weights.
+#
+# `uvicorn --workers N` starts N fresh interpreters, and each one loads its own
+# copy of the BERT weights. Here the parent loads the weights once and then
+# forks the workers. The weight tensors are never written after loading, so
+# their pages stay shared copy-on-write between all workers. Each worker's
+# unique memory is only its activations, caches and interpreter state.
+#
+#   python -m app.serve --workers 8 --port 8000
+#
+# The ONNX backends are not preloaded, because onnxruntime sessions own thread
+# pools that do not survive fork. Their workers load the model themselves.
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the spam API from workers sharing one copy of the model.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--memory-report", type=float, default=60.0,
+                        help="Seconds between per-worker memory reports (0 disables)")
+    return parser.parse_args()
+
+
+def run_worker(sock, args):
+    import uvicorn
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, signal.SIG_DFL)
+    config = uvicorn.Config("app.main:app", log_level=args.log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def report_memory(workers):
+    from app.metrics import read_memory
+
+    rows = [(pid, read_memory(pid)) for pid in sorted(workers)]
+    rows = [(pid, memory) for pid, memory in rows if memory is not None]
+    if not rows:
+        return
+    print(f"{'worker':>8} {'rss MB':>8} {'unique MB':>10} {'shared MB':>10} {'pss MB':>8}")
+    for pid, m in rows:
+        print(f"{pid:>8} {m['rss'] / 1e6:>8.0f} {m['unique'] / 1e6:>10.0f} {m['shared'] / 1e6:>10.0f} {m['pss'] / 1e6:>8.0f}")
+    total_rss = sum(m["rss"] for _, m in rows)
+    total_pss = sum(m["pss"] for _, m in rows)
+    print(f"Total: {total_pss / 1e6:.0f} MB actually used (sum of pss) vs {total_rss / 1e6:.0f} MB sum of rss")
+    sys.stdout.flush()
+
+
+def main():
+    args = parse_args()
+    # Split the cores between the workers unless configured explicitly
+    os.environ.setdefault("SPAM_TORCH_INTRA_OP_THREADS", str(max(1, (os.cpu_count() or 1) // args.workers)))
+
+    import torch
+    from app import model_loader
+    from app.database import get_pool
+
+    # A single thread keeps torch from starting its OpenMP pool in the parent,
+    # which forked children could deadlock on. Workers set their own count.
+    torch.set_num_threads(1)
+    if model_loader.INFERENCE_BACKEND.startswith("onnx"):
+        print(f"{model_loader.INFERENCE_BACKEND} backend: each worker loads its own model.")
+    else:
+        started = time.perf_counter()
+        model_loader.preload_model()
+        print(f"Model preloaded in {time.perf_counter() - started:.1f}s")
+
+    # Create the schema once, and do not hand open SQLite connections to the workers
+    get_pool().close()
+    import app.main  # noqa: F401
+
+    # Keep the cyclic GC from writing to (and so un-sharing) everything allocated so far
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    print(f"Listening on http://{args.host}:{args.port} with {args.workers} workers")
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(sock, args)
+            finally:
+                os._exit(0)
+        return pid
+
+    workers = {spawn() for _ in range(args.workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    next_report = time.monotonic() + args.memory_report
+    while workers:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            time.sleep(0.5)
+            if args.memory_report > 0 and time.monotonic() >= next_report:
+                report_memory(workers)
+                next_report = time.monotonic() + args.memory_report
+            continue
+        workers.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting it")
+            time.sleep(1.0)
+            workers.add(spawn())
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -32,7 +32,9 @@ document.addEventListener('DOMContentLoaded', () => {
     let statsChart = null;
     let sessionApiKey = localStorage.getItem('spam_api_key');
 
-    loadStats();
+    // Dashboard state, kept current by the /stats/stream server-sent events
+    let dashboard = null;
+    subscribeStats();
 
     // Auto-auth for demo
     if (!sessionApiKey) generateApiKey(true);
@@ -92,7 +94,7 @@ document.addEventListener('DOMContentLoaded', () => {
             currentLogId = data.log_id;
 
             showResult(data.prediction);
-            loadStats(); // Refresh stats & table
+            refreshIfPolling(); // The stream pushes the new stats on its own
 
         } catch (error) {
             console.error(error);
@@ -118,7 +120,7 @@ document.addEventListener('DOMContentLoaded', () => {
             });
             feedbackSection.classList.add('hidden');
             feedbackThanks.classList.remove('hidden');
-            loadStats();
+            refreshIfPolling();
         } catch (e) { console.error(e); }
     }
 
@@ -168,6 +170,10 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- Analytics View ---
     let historyChart = null;
     async function loadHistoryStats() {
+        if (dashboard) {
+            renderHistoryChart(dashboard.history);
+            return;
+        }
         try {
             const res = await fetch('/stats/history');
             const data = await res.json();
@@ -241,7 +247,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     headers: { 'x-api-key': sessionApiKey }
                 });
                 alert('Logs cleared.');
-                loadStats(); // refresh dashboard
+                refreshIfPolling();
             } catch (e) { console.error(e); }
         });
     }
@@ -274,6 +280,57 @@ document.addEventListener('DOMContentLoaded', () => {
         if (feedbackThanks) feedbackThanks.classList.add('hidden');
     }
 
+    // --- Live stats ---
+    function subscribeStats() {
+        if (!window.EventSource) {
+            loadStats();
+            return;
+        }
+        // EventSource reconnects by itself; each connection starts with a snapshot
+        const source = new EventSource('/stats/stream');
+        source.addEventListener('snapshot', (e) => {
+            dashboard = JSON.parse(e.data);
+            renderDashboard();
+        });
+        source.addEventListener('delta', (e) => {
+            if (!dashboard) return;
+            applyDelta(dashboard, JSON.parse(e.data));
+            renderDashboard();
+        });
+    }
+
+    function applyDelta(state, delta) {
+        if (delta.total_requests !== undefined) state.total_requests = delta.total_requests;
+        ['distribution', 'feedback_stats', 'history'].forEach(key => {
+            Object.entries(delta[key] || {}).forEach(([k, v]) => {
+                if (v === null) delete state[key][k];
+                else state[key][k] = v;
+            });
+        });
+        if (delta.logs) {
+            const byId = new Map(state.recent_logs.map(log => [log.id, log]));
+            delta.logs.forEach(log => byId.set(log.id, log));
+            state.recent_logs = Array.from(byId.values())
+                .sort((a, b) => b.id - a.id)
+                .slice(0, 5);
+        }
+    }
+
+    function renderDashboard() {
+        const spam = dashboard.distribution['Spam'] || 0;
+        const ham = dashboard.distribution['Ham'] || 0;
+        statTotal.textContent = dashboard.total_requests;
+        statSpam.textContent = spam;
+        statHam.textContent = ham;
+        updateChart(spam, ham);
+        updateTable(dashboard.recent_logs);
+        if (!views['Analytics'].classList.contains('hidden')) renderHistoryChart(dashboard.history);
+    }
+
+    function refreshIfPolling() {
+        if (!window.EventSource) loadStats();
+    }
+
     async function loadStats() {
         try {
             const res = await fetch('/stats');
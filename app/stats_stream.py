@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+
+from app.database import get_daily_stats, get_recent_logs, get_stats
+
+# Stream settings (override through the environment)
+STREAM_INTERVAL = float(os.environ.get("SPAM_STATS_STREAM_INTERVAL", "1.0"))
+STREAM_POLL = float(os.environ.get("SPAM_STATS_STREAM_POLL", "5.0"))
+STREAM_QUEUE = int(os.environ.get("SPAM_STATS_STREAM_QUEUE", "16"))
+RECENT_LOGS = 5
+
+
+def read_state():
+    """Everything the dashboard shows, read from the rollup tables and the newest log rows."""
+    state = get_stats()
+    state["recent_logs"] = get_recent_logs(RECENT_LOGS)
+    state["history"] = get_daily_stats()
+    return state
+
+
+def _changed(old, new):
+    """Keys of `new` whose values differ from `old`, plus keys that disappeared (as None)."""
+    changes = {key: value for key, value in new.items() if old.get(key) != value}
+    changes.update({key: None for key in old if key not in new})
+    return changes
+
+
+def diff_state(old, new):
+    """A delta event turning `old` into `new`, or None if nothing changed.
+
+    Counters are sent as their new values rather than increments, so applying a
+    delta twice is harmless. Recent logs are sent only if they are new or
+    their feedback changed.
+    """
+    delta = {}
+    if old["total_requests"] != new["total_requests"]:
+        delta["total_requests"] = new["total_requests"]
+    for key in ("distribution", "feedback_stats", "history"):
+        changes = _changed(old[key], new[key])
+        if changes:
+            delta[key] = changes
+    previous = {log["id"]: log for log in old["recent_logs"]}
+    logs = [log for log in new["recent_logs"] if previous.get(log["id"]) != log]
+    if logs:
+        delta["logs"] = logs
+    return delta or None
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class StatsBroadcaster:
+    """Computes dashboard stats once per interval and pushes deltas to every subscriber.
+
+    Request handlers call `notify()` after a write. Notifications arriving
+    within `interval` seconds are coalesced into one read and one update, and
+    the short wait also lets the buffered log writer commit the rows. Writes
+    made by other worker processes are picked up by polling every `poll`
+    seconds. Nothing runs while there are no subscribers. A subscriber that
+    falls `queue_size` events behind is sent a fresh snapshot instead.
+    """
+
+    def __init__(self, interval=STREAM_INTERVAL, poll=STREAM_POLL, queue_size=STREAM_QUEUE):
+        self.interval = interval
+        self.poll = max(interval, poll)
+        self.queue_size = max(1, queue_size)
+        self.state = None
+        self._subscribers = set()
+        self._changed = asyncio.Event()
+        self._reset = False
+        self._task = None
+        self.updates = 0
+        self.resyncs = 0
+        self.errors = 0
+
+    def notify(self, reset=False):
+        """Signal a change; `reset` after logs are cleared, so clients resync from a snapshot."""
+        self._reset = self._reset or reset
+        self._changed.set()
+
+    async def subscribe(self):
+        """Register a subscriber; returns its queue, which starts with a snapshot event.
+
+        A None in the queue means the stream has ended and the response should close.
+        """
+        if self.state is None:
+            self.state = await asyncio.to_thread(read_state)
+        queue = asyncio.Queue(self.queue_size)
+        queue.put_nowait(format_event("snapshot", self.state))
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def _publish(self, event, data):
+        message = format_event(event, data)
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Too far behind for deltas to be useful; start it over from the current state
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(format_event("snapshot", self.state))
+                self.resyncs += 1
+
+    def _close(self, queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def _run(self):
+        try:
+            while self._subscribers:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), self.poll)
+                    # Coalesce the burst that started with this change
+                    await asyncio.sleep(self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._changed.clear()
+
+                try:
+                    new_state = await asyncio.to_thread(read_state)
+                except Exception as e:
+                    # Keep serving the subscribers; the next change or poll retries
+                    print(f"Stats stream read failed: {e}")
+                    self.errors += 1
+                    continue
+                reset, self._reset = self._reset, False
+                old_state, self.state = self.state, new_state
+                if reset or new_state["total_requests"] < old_state["total_requests"]:
+                    self._publish("snapshot", new_state)
+                else:
+                    delta = diff_state(old_state, new_state)
+                    if delta is None:
+                        continue
+                    self._publish("delta", delta)
+                self.updates += 1
+        except Exception as e:
+            print(f"Stats stream stopped: {e}")
+            # End every stream so the clients' EventSource reconnects and resubscribes
+            for queue in list(self._subscribers):
+                self._close(queue)
+            self._subscribers.clear()
+        finally:
+            # The next subscriber reads a fresh state
+            self.state = None
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "updates": self.updates,
+            "resyncs": self.resyncs,
+            "errors": self.errors,
+            "interval_seconds": self.interval,
+            "poll_seconds": self.poll,
+        }
+
+
+stats_broadcaster = StatsBroadcaster()
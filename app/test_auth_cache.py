@@ -0,0 +1,82 @@
+import pytest
+
+from app import auth_cache
+from app.auth_cache import ApiKeyCache
+
+# API key cache tests; the database lookups and the clock are replaced, so
+# neither SQLite nor the model is needed.
+
+
+class FakeBackend:
+    def __init__(self):
+        self.now = 1000.0
+        self.valid_keys = {"good"}
+        self.generation = 0
+        self.lookups = 0
+
+    def monotonic(self):
+        return self.now
+
+    def check_api_key_valid(self, key):
+        self.lookups += 1
+        return key in self.valid_keys
+
+    def get_cache_generation(self, name):
+        return self.generation
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    fake = FakeBackend()
+    monkeypatch.setattr(auth_cache, "time", fake)
+    monkeypatch.setattr(auth_cache, "check_api_key_valid", fake.check_api_key_valid)
+    monkeypatch.setattr(auth_cache, "get_cache_generation", fake.get_cache_generation)
+    return fake
+
+
+def test_valid_keys_are_cached_until_the_ttl(backend):
+    cache = ApiKeyCache(ttl=60, negative_ttl=10, generation_check=1000)
+    assert cache.is_valid("good") and cache.is_valid("good")
+    assert backend.lookups == 1
+    backend.now += 61
+    assert cache.is_valid("good")
+    assert backend.lookups == 2
+
+
+def test_unknown_keys_are_cached_for_the_negative_ttl(backend):
+    cache = ApiKeyCache(ttl=60, negative_ttl=10, generation_check=1000)
+    assert not cache.is_valid("guess")
+    assert not cache.is_valid("guess")
+    assert backend.lookups == 1
+    # The key is created elsewhere: it is accepted once the negative entry expires
+    backend.valid_keys.add("guess")
+    backend.now += 11
+    assert cache.is_valid("guess")
+    assert backend.lookups == 2
+
+
+def test_generation_change_drops_every_entry(backend):
+    cache = ApiKeyCache(ttl=60, negative_ttl=10, generation_check=1)
+    assert cache.is_valid("good")
+    # Another worker revokes the key, bumping the generation
+    backend.valid_keys.discard("good")
+    backend.generation += 1
+    assert cache.is_valid("good")  # the generation is only re-read every second
+    backend.now += 1
+    assert not cache.is_valid("good")
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_invalidate_drops_one_key(backend):
+    cache = ApiKeyCache(ttl=60, negative_ttl=10, generation_check=1000)
+    cache.is_valid("good")
+    backend.valid_keys.discard("good")
+    cache.invalidate("good")
+    assert not cache.is_valid("good")
+
+
+def test_cache_size_is_bounded(backend):
+    cache = ApiKeyCache(ttl=60, negative_ttl=10, max_size=3, generation_check=1000)
+    for i in range(10):
+        cache.is_valid(f"guess-{i}")
+    assert cache.stats()["size"] == 3
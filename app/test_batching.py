@@ -0,0 +1,147 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.batching import MicroBatcher
+from app.executor import InferenceExecutor, InferenceQueueFull
+
+# Micro-batcher and executor tests; predict functions are plain Python, so no
+# model is needed.
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 5))
+
+
+class Recorder:
+    """A predict function that records the batches it was called with."""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        if self.fail:
+            raise ValueError("forward pass failed")
+        return [text.upper() for text in texts]
+
+
+def test_concurrent_requests_share_batches_up_to_the_size_limit():
+    predict = Recorder()
+
+    async def scenario():
+        batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=50)
+        await batcher.start()
+        results = await asyncio.gather(*(batcher.submit(f"m{i}") for i in range(10)))
+        await batcher.stop()
+        return results, batcher.stats()
+
+    results, stats = run(scenario())
+    assert results == [f"M{i}" for i in range(10)]
+    assert [len(batch) for batch in predict.batches] == [4, 4, 2]
+    assert stats["total_requests"] == 10 and stats["total_batches"] == 3
+
+
+def test_a_lone_request_runs_once_the_wait_expires():
+    predict = Recorder()
+
+    async def scenario():
+        batcher = MicroBatcher(predict, max_batch_size=16, max_wait_ms=20)
+        await batcher.start()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await batcher.submit("hello")
+        elapsed = loop.time() - started
+        await batcher.stop()
+        return result, elapsed
+
+    result, elapsed = run(scenario())
+    assert result == "HELLO" and predict.batches == [["hello"]]
+    assert 0.015 <= elapsed < 1.0
+
+
+def test_a_failed_batch_fails_every_caller_and_the_batcher_keeps_running():
+    predict = Recorder(fail=True)
+
+    async def scenario():
+        batcher = MicroBatcher(predict, max_batch_size=8, max_wait_ms=20)
+        await batcher.start()
+        results = await asyncio.gather(*(batcher.submit(f"m{i}") for i in range(3)), return_exceptions=True)
+        predict.fail = False
+        after = await batcher.submit("again")
+        await batcher.stop()
+        return results, after
+
+    results, after = run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert after == "AGAIN"
+
+
+def test_stop_fails_requests_in_progress_and_queued():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow_predict(texts):
+            await release.wait()
+            return texts
+
+        batcher = MicroBatcher(lambda texts: texts, max_batch_size=1, max_wait_ms=0)
+        batcher._predict = slow_predict  # hold the worker on the first batch
+        await batcher.start()
+        tasks = [asyncio.create_task(batcher.submit(f"m{i}")) for i in range(3)]
+        await asyncio.sleep(0.01)
+        await batcher.stop()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = run(scenario())
+    # Both the batch in progress and the queued requests are failed
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_submit_rejects_when_the_queue_is_full():
+    async def scenario():
+        batcher = MicroBatcher(lambda texts: texts, max_batch_size=1, max_wait_ms=0, max_queue=2)
+        await batcher.start()
+        batcher.queue.put_nowait(("x", asyncio.get_running_loop().create_future(), 0.0))
+        batcher.queue.put_nowait(("y", asyncio.get_running_loop().create_future(), 0.0))
+        # The worker has not run yet, so the queue is still full
+        with pytest.raises(InferenceQueueFull):
+            await batcher.submit("z")
+        await batcher.stop()
+        return batcher.stats()["rejected"]
+
+    assert run(scenario()) == 1
+
+
+def test_batches_run_on_the_executor():
+    predict = Recorder()
+
+    async def scenario():
+        executor = InferenceExecutor(max_workers=2)
+        batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=10, executor=executor)
+        await batcher.start()
+        results = await asyncio.gather(*(batcher.submit(f"m{i}") for i in range(5)))
+        await batcher.stop()
+        executor.shutdown()
+        return results
+
+    assert run(scenario()) == [f"M{i}" for i in range(5)]
+
+
+def test_executor_sheds_jobs_beyond_max_pending():
+    async def scenario():
+        executor = InferenceExecutor(max_workers=1, max_pending=1)
+        blocker = threading.Event()
+        first = asyncio.create_task(executor.run(blocker.wait, 5))
+        await asyncio.sleep(0.01)
+        with pytest.raises(InferenceQueueFull):
+            await executor.run(len, "x")
+        blocker.set()
+        await first
+        executor.shutdown()
+        return executor.stats()
+
+    stats = run(scenario())
+    assert stats["rejected"] == 1 and stats["pending"] == 0
@@ -0,0 +1,204 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import database, log_writer
+from app.log_writer import PredictionLogWriter
+from app.retention import archive_old_logs
+
+# Database and log writer tests; they run against a throwaway SQLite file and
+# need neither the model nor the API server.
+
+
+@pytest.fixture(autouse=True)
+def temp_db(tmp_path, monkeypatch):
+    # get_pool() opens (and initializes) a new pool whenever DB_PATH changes
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "test.db"))
+    yield
+    database.get_pool().close()
+
+
+def count_logs():
+    with database.get_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM prediction_logs").fetchone()[0]
+
+
+def test_log_writer_returns_none_for_dropped_rows():
+    writer = PredictionLogWriter(batch_size=100, max_pending=3, id_block=10)
+    ids = writer.log_many([f"m{i}" for i in range(5)], ["Ham"] * 5)
+    assert ids[3:] == [None, None]
+    assert all(isinstance(i, int) for i in ids[:3])
+    assert writer.stats()["dropped"] == 2
+
+    writer.start()
+    assert writer.flush(5)
+    writer.stop()
+    assert count_logs() == 3
+    assert writer.stats()["written"] == 3
+
+
+def test_reserve_log_ids_hands_out_disjoint_blocks():
+    first = database.reserve_log_ids(10)
+    second = database.reserve_log_ids(5)
+    assert second == first + 10
+    # Rows logged directly are numbered after every reserved block
+    assert database.log_prediction("direct", "Ham") == second + 5
+
+
+def test_log_writer_writes_rows_under_the_ids_it_returned():
+    writer = PredictionLogWriter(batch_size=100, max_pending=100, id_block=4)
+    database.log_prediction("before", "Ham")
+    ids = writer.log_many([f"m{i}" for i in range(6)], ["Spam"] * 6, ["cascade"] * 6)
+    ids.append(writer.log("last", "Ham"))
+    assert len(set(ids)) == 7
+    assert writer.is_pending(ids[0])
+
+    writer.start()
+    assert writer.flush(5)
+    writer.stop()
+    assert not writer.is_pending(ids[0])
+    with database.get_connection() as conn:
+        rows = dict(conn.execute("SELECT id, text FROM prediction_logs").fetchall())
+    assert [rows[i] for i in ids] == [f"m{i}" for i in range(6)] + ["last"]
+    # Blocks reserved by the writer never collide with directly logged rows
+    assert database.log_prediction("after", "Ham") > max(ids)
+
+
+def test_bulk_logging_with_default_settings_keeps_every_row():
+    # A full-size /predict/batch arriving while a /predict row is buffered
+    writer = PredictionLogWriter()
+    single = writer.log("single", "Ham")
+    bulk = database.log_predictions([f"b{i}" for i in range(10000)], ["Spam"] * 10000)
+    assert None not in bulk and len(set(bulk)) == 10000
+    assert single not in bulk
+
+    writer.start()
+    assert writer.flush(5)
+    writer.stop()
+    assert count_logs() == 10001
+    assert writer.stats()["dropped"] == 0
+
+
+def test_log_writer_reserves_ids_on_its_own_thread(monkeypatch):
+    reserved_on = []
+
+    def reserve(count):
+        reserved_on.append(threading.current_thread().name)
+        return database.reserve_log_ids(count)
+
+    monkeypatch.setattr(log_writer, "reserve_log_ids", reserve)
+    writer = PredictionLogWriter(batch_size=1000, id_block=100)
+    writer.start()  # reserves the first block
+    ids = [writer.log(f"a{i}", "Ham") for i in range(60)]
+    # Below one spare block: the writer thread reserves the next one
+    assert writer.flush(5)
+    ids += [writer.log(f"b{i}", "Ham") for i in range(100)]
+    writer.stop()
+
+    assert len(reserved_on) > 1 and set(reserved_on[1:]) == {"log-writer"}
+    assert writer.stats()["id_stalls"] == 0
+    assert len(set(ids)) == 160 and count_logs() == 160
+
+
+def test_update_feedback_reports_missing_rows():
+    log_id = database.log_prediction("hello", "Ham")
+    assert database.update_feedback(log_id, "Correct")
+    assert not database.update_feedback(log_id + 1000, "Correct")
+
+
+def test_stats_rollups_follow_inserts_and_feedback():
+    first = database.log_prediction("win a prize", "Spam")
+    database.log_predictions(["hi", "see you"], ["Ham", "Ham"])
+    database.update_feedback(first, "Correct")
+    stats = database.get_stats()
+    assert stats["total_requests"] == 3
+    assert stats["distribution"] == {"Spam": 1, "Ham": 2}
+    assert stats["feedback_stats"] == {"Correct": 1}
+
+    # Changing feedback moves the count rather than adding to it
+    database.update_feedback(first, "Incorrect")
+    assert database.get_stats()["feedback_stats"] == {"Incorrect": 1}
+
+    history = database.get_daily_stats()
+    assert sum(day["Spam"] for day in history.values()) == 1
+    assert sum(day["Ham"] for day in history.values()) == 2
+
+
+def test_clear_all_logs_resets_rollups():
+    database.log_predictions(["a", "b"], ["Spam", "Ham"])
+    database.clear_all_logs()
+    assert count_logs() == 0
+    assert database.get_stats() == {"total_requests": 0, "distribution": {}, "feedback_stats": {}}
+    assert database.get_daily_stats() == {}
+
+    database.log_prediction("c", "Ham")
+    assert database.get_stats()["total_requests"] == 1
+
+
+def insert_logs(rows):
+    # (text, prediction, timestamp, feedback) rows with explicit timestamps
+    with database.get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO prediction_logs (text, prediction, timestamp, user_feedback) VALUES (?, ?, ?, ?)",
+            rows
+        )
+
+
+def test_browse_logs_pages_newest_first():
+    base = datetime(2026, 1, 1, 12, 0)
+    # Two rows per timestamp, so the id breaks ties between pages
+    insert_logs([(f"m{i}", "Spam" if i % 3 == 0 else "Ham", base + timedelta(minutes=i // 2), None)
+                 for i in range(10)])
+    seen, before = [], None
+    while True:
+        page = database.browse_logs(limit=3, before=before)
+        seen.extend(log["text"] for log in page)
+        if len(page) < 3:
+            break
+        before = (page[-1]["timestamp"], page[-1]["id"])
+    assert seen == [f"m{i}" for i in reversed(range(10))]
+
+
+def test_browse_logs_filters():
+    base = datetime(2026, 1, 1, 9, 0)
+    insert_logs([
+        ("a", "Spam", base, "Correct"),
+        ("b", "Ham", base + timedelta(hours=1), None),
+        ("c", "Spam", base + timedelta(days=1), None),
+    ])
+    texts = lambda **filters: [log["text"] for log in database.browse_logs(**filters)]
+    assert texts(prediction="Spam") == ["c", "a"]
+    assert texts(feedback="none") == ["c", "b"]
+    assert texts(feedback="Correct") == ["a"]
+    assert texts(since=base + timedelta(hours=1)) == ["c", "b"]
+    assert texts(since=datetime(2026, 1, 1), until=datetime(2026, 1, 2)) == ["b", "a"]
+
+
+def test_archive_old_logs_moves_only_old_rows(tmp_path):
+    now = datetime.now()
+    insert_logs([(f"old{i}", "Ham", now - timedelta(days=40 + i), None) for i in range(5)])
+    insert_logs([("new", "Spam", now, None)])
+    archive_path = str(tmp_path / "archive.db")
+
+    assert archive_old_logs(max_age_days=30, batch_size=2, pause_ms=0, archive_path=archive_path) == 5
+    assert [log["text"] for log in database.browse_logs()] == ["new"]
+    archive = sqlite3.connect(archive_path)
+    try:
+        archived = sorted(row[0] for row in archive.execute("SELECT text FROM prediction_logs"))
+    finally:
+        archive.close()
+    assert archived == [f"old{i}" for i in range(5)]
+    # Archived rows stay counted in the rollups
+    assert database.get_stats()["total_requests"] == 6
+    assert archive_old_logs(max_age_days=30, pause_ms=0, archive_path=archive_path) == 0
+
+
+def test_only_key_changes_bump_the_cache_generation():
+    start = database.get_cache_generation("api_keys")
+    key = database.create_api_key()
+    # Creating keys is unauthenticated, so it must not flush every worker's cache
+    assert database.get_cache_generation("api_keys") == start
+    assert database.deactivate_api_key(key)
+    assert database.get_cache_generation("api_keys") == start + 1
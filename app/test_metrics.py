@@ -0,0 +1,16 @@
+from app import metrics
+
+# Metrics rendering tests; they need neither the model nor the API server.
+
+
+def test_collected_counter_renders_as_counter():
+    counter = metrics.CollectedCounter("test_rows_total", "Rows by outcome.", ["state"])
+    counter.set(3, "written")
+    lines = counter.render()
+    assert "# TYPE test_rows_total counter" in lines
+    assert 'test_rows_total{state="written"} 3' in lines
+
+
+def test_process_cpu_is_exported_as_a_counter():
+    text = metrics.render()
+    assert "# TYPE spam_process_cpu_seconds_total counter" in text
@@ -0,0 +1,91 @@
+import pytest
+
+from app import database, result_cache as result_cache_module
+from app.result_cache import ResultCache
+
+# Result cache tests; a fake clock drives expiry and persistence uses a throwaway
+# SQLite file, so nothing needs the model.
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "test.db"))
+    yield
+    database.get_pool().close()
+
+
+def test_persisted_entries_are_saved_in_the_background(temp_db):
+    cache = ResultCache(persist=True, save_interval_ms=10)
+    cache.set_model_version("v1")
+    cache.start()
+    for i in range(50):
+        cache.put(f"message {i}", "Ham")
+    cache.stop()
+    assert cache.stats()["saved"] == 50 and cache.stats()["unsaved"] == 0
+
+    reloaded = ResultCache(persist=True)
+    reloaded.set_model_version("v1")
+    assert reloaded.get("message 7") == "Ham"
+    # Another model version never sees them
+    other = ResultCache(persist=True)
+    other.set_model_version("v2")
+    assert other.get("message 7") is None
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(result_cache_module, "time", fake)
+    return fake
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ResultCache(ttl=60)
+    cache.put("win a prize", "Spam")
+    clock.now += 59
+    assert cache.get("win a prize") == "Spam"
+    clock.now += 2
+    assert cache.get("win a prize") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_size=2)
+    cache.put("a", "Ham")
+    cache.put("b", "Ham")
+    assert cache.get("a") == "Ham"  # "b" is now the least recently used
+    cache.put("c", "Spam")
+    assert cache.get("b") is None
+    assert cache.get("a") == "Ham" and cache.get("c") == "Spam"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_keys_ignore_whitespace_differences():
+    cache = ResultCache()
+    cache.put("see you  at\tnoon", "Ham")
+    assert cache.get(" see you at noon ") == "Ham"
+
+
+def test_model_version_change_drops_entries():
+    cache = ResultCache()
+    cache.set_model_version("v1")
+    cache.put("hello", "Ham")
+    cache.set_model_version("v1")
+    assert cache.get("hello") == "Ham"
+    cache.set_model_version("v2")
+    assert cache.get("hello") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_zero_size_disables_the_cache():
+    cache = ResultCache(max_size=0)
+    cache.put("hello", "Ham")
+    assert cache.get("hello") is None
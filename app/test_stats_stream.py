@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+from app import stats_stream
+from app.stats_stream import StatsBroadcaster
+
+# Stats stream tests; read_state is replaced, so no database is needed.
+
+
+def state(total):
+    return {"total_requests": total, "distribution": {"Ham": total}, "feedback_stats": {},
+            "recent_logs": [], "history": {}}
+
+
+def test_broadcaster_survives_a_failed_read(monkeypatch):
+    reads = iter([state(1), RuntimeError("database is locked"), state(2)])
+
+    def read_state():
+        result = next(reads)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(stats_stream, "read_state", read_state)
+
+    async def scenario():
+        broadcaster = StatsBroadcaster(interval=0.01, poll=0.02)
+        queue = await broadcaster.subscribe()
+        assert (await queue.get()).startswith("event: snapshot")
+        delta = await asyncio.wait_for(queue.get(), 2)
+        await broadcaster.stop()
+        return broadcaster, delta
+
+    broadcaster, delta = asyncio.run(scenario())
+    assert delta.startswith("event: delta")
+    assert json.loads(delta.split("data: ", 1)[1])["total_requests"] == 2
+    assert broadcaster.errors == 1
+
+
+def test_broadcaster_ends_streams_when_it_stops_unexpectedly(monkeypatch):
+    monkeypatch.setattr(stats_stream, "read_state", lambda: state(1))
+    monkeypatch.setattr(stats_stream, "diff_state", lambda old, new: 1 / 0)
+
+    async def scenario():
+        broadcaster = StatsBroadcaster(interval=0.01, poll=0.02)
+        queue = await broadcaster.subscribe()
+        await queue.get()
+        return await asyncio.wait_for(queue.get(), 2), broadcaster.stats()["subscribers"]
+
+    end, subscribers = asyncio.run(scenario())
+    assert end is None and subscribers == 0
@@ -0,0 +1,355 @@
+import argparse
+import csv
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# End-to-end HTTP load test for the FastAPI service.
+#
+# Starts `app.main:app` under uvicorn (against a throwaway SQLite database),
+# drives concurrent load at each endpoint with a message mix sampled from
+# data/raw/spam.csv, samples the server's CPU and RSS, and writes a JSON report.
+# Given --baseline, it exits non-zero when throughput, tail latency or error
+# rate regress past --threshold.
+#
+#   python scripts/benchmark_api.py --concurrency 8 --duration 20 --save-baseline bench_baseline.json
+#   python scripts/benchmark_api.py --concurrency 8 --duration 20 --baseline bench_baseline.json
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("predict", "predict_batch", "stats", "history")
+
+parser = argparse.ArgumentParser(description="HTTP load test and regression check for the spam API.")
+parser.add_argument("--url", default=None, help="Benchmark an already running server instead of starting one")
+parser.add_argument("--port", type=int, default=0, help="Port for the local server (0 = pick a free one)")
+parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+parser.add_argument("--preload", action="store_true",
+                    help="Serve with app.serve (weights loaded once, shared by the workers)")
+parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+parser.add_argument("--concurrency", type=int, default=8)
+parser.add_argument("--duration", type=float, default=15.0, help="Seconds of load per scenario")
+parser.add_argument("--warmup", type=float, default=2.0, help="Seconds of unmeasured load per scenario")
+parser.add_argument("--batch-size", type=int, default=32, help="Texts per /predict/batch request")
+parser.add_argument("--data", default=os.path.join(BASE_DIR, "data", "raw", "spam.csv"))
+parser.add_argument("--output", default=os.path.join(BASE_DIR, "bench_output.json"))
+parser.add_argument("--baseline", default=None, help="Report to compare against")
+parser.add_argument("--save-baseline", default=None, help="Also write this run's report here")
+parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative regression (0.10 = 10%%)")
+parser.add_argument("--seed", type=int, default=42)
+args = parser.parse_args()
+
+random.seed(args.seed)
+
+
+def load_messages(path):
+    """Message bodies from the raw corpus, keeping its natural ham/spam mix."""
+    with open(path, encoding="latin-1", newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [row[1] for row in reader if len(row) > 1 and row[0] in ("ham", "spam")]
+
+
+messages = load_messages(args.data)
+
+
+# --- Server process and resource sampling ---
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree(pid):
+    """The server pid plus its worker processes (Linux /proc)."""
+    pids, queue = [], [pid]
+    while queue:
+        current = queue.pop()
+        pids.append(current)
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                queue.extend(int(p) for p in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def sample_process(pid):
+    """(cpu seconds, rss bytes) summed over the server's process tree."""
+    try:
+        import psutil
+        procs = [psutil.Process(pid)] + psutil.Process(pid).children(recursive=True)
+        cpu = rss = 0.0
+        for p in procs:
+            try:
+                times = p.cpu_times()
+                cpu += times.user + times.system
+                rss += p.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return cpu, rss
+    except ImportError:
+        pass
+
+    ticks = os.sysconf("SC_CLK_TCK")
+    page = os.sysconf("SC_PAGE_SIZE")
+    cpu = rss = 0.0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / ticks
+            with open(f"/proc/{p}/statm") as f:
+                rss += int(f.read().split()[1]) * page
+        except (OSError, IndexError, ValueError):
+            pass
+    return cpu, rss
+
+
+class ResourceMonitor(threading.Thread):
+    """Samples server CPU and RSS while a scenario runs."""
+
+    def __init__(self, pid, interval=0.25):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.samples.append((time.perf_counter(),) + sample_process(self.pid))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.samples.append((time.perf_counter(),) + sample_process(self.pid))
+
+    def summary(self):
+        if len(self.samples) < 2:
+            return {}
+        (t0, cpu0, _), (t1, cpu1, _) = self.samples[0], self.samples[-1]
+        rss = [s[2] for s in self.samples]
+        return {
+            "cpu_percent": 100.0 * (cpu1 - cpu0) / (t1 - t0),
+            "rss_mb_peak": max(rss) / 1e6,
+            "rss_mb_mean": sum(rss) / len(rss) / 1e6,
+        }
+
+
+def start_server():
+    port = args.port or free_port()
+    db_dir = tempfile.mkdtemp(prefix="spam-bench-")
+    env = dict(os.environ, SPAM_DB_PATH=os.path.join(db_dir, "bench.db"))
+    module = ["app.serve"] if args.preload else ["uvicorn", "app.main:app"]
+    server = subprocess.Popen(
+        [sys.executable, "-m", *module, "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=BASE_DIR, env=env
+    )
+    return server, f"http://127.0.0.1:{port}"
+
+
+def wait_ready(base_url, server, timeout=300):
+    """Poll /readyz until the model is loaded and warmed up. Returns an API key."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            status, body = Client(base_url).request("GET", "/readyz")
+            if status == 200:
+                print(f"Server ready, startup phases: {body['phases']}")
+                return Client(base_url).request("POST", "/auth/generate-key")[1]["api_key"]
+        except (OSError, http.client.HTTPException, ValueError, KeyError):
+            pass
+        time.sleep(1.0)
+    raise RuntimeError("Server did not become ready in time")
+
+
+# --- Load generation ---
+
+class Client:
+    """Keep-alive HTTP client; one per load thread."""
+
+    def __init__(self, base_url, api_key=None):
+        url = urlparse(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.api_key = api_key
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["x-api-key"] = self.api_key
+        try:
+            self.conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            raise
+        return response.status, json.loads(data) if data else None
+
+
+def scenario_request(name, rng):
+    """(method, path, body, messages in this request) for one request of a scenario."""
+    if name == "predict":
+        return "POST", "/predict", {"text": rng.choice(messages)}, 1
+    if name == "predict_batch":
+        return "POST", "/predict/batch", {"texts": rng.choices(messages, k=args.batch_size)}, args.batch_size
+    if name == "stats":
+        return "GET", "/stats", None, 0
+    return "GET", "/stats/history", None, 0
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(name, base_url, api_key, server_pid):
+    results = []  # (measured, latency, ok, messages)
+    lock = threading.Lock()
+    warmup_end = time.perf_counter() + args.warmup
+    end = warmup_end + args.duration
+
+    def worker(index):
+        rng = random.Random(args.seed + index)
+        client = Client(base_url, api_key)
+        local = []
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                break
+            method, path, body, count = scenario_request(name, rng)
+            began = time.perf_counter()
+            try:
+                status, _ = client.request(method, path, body)
+                ok = status == 200
+            except (OSError, http.client.HTTPException, ValueError):
+                ok = False
+            finished = time.perf_counter()
+            local.append((began >= warmup_end, finished - began, ok, count))
+        with lock:
+            results.extend(local)
+
+    monitor = ResourceMonitor(server_pid) if server_pid else None
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        futures = [pool.submit(worker, i) for i in range(args.concurrency)]
+        if monitor:
+            time.sleep(max(0.0, warmup_end - time.perf_counter()))
+            monitor.start()
+        for f in futures:
+            f.result()
+    if monitor:
+        monitor.stop()
+
+    measured = [r for r in results if r[0]]
+    latencies = sorted(r[1] * 1000.0 for r in measured)
+    errors = sum(1 for r in measured if not r[2])
+    report = {
+        "requests": len(measured),
+        "errors": errors,
+        "error_rate": errors / len(measured) if measured else 0.0,
+        "requests_per_sec": len(measured) / args.duration,
+        "messages_per_sec": sum(r[3] for r in measured if r[2]) / args.duration,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else 0.0,
+        },
+    }
+    if monitor:
+        report["server"] = monitor.summary()
+    return report
+
+
+def compare(report, baseline, threshold):
+    """List of human-readable regressions of `report` against `baseline`."""
+    regressions = []
+    for name, current in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if base["requests_per_sec"] > 0 and current["requests_per_sec"] < base["requests_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {current['requests_per_sec']:.1f} < "
+                               f"baseline {base['requests_per_sec']:.1f} req/s")
+        for q in ("p95", "p99"):
+            if base["latency_ms"][q] > 0 and current["latency_ms"][q] > base["latency_ms"][q] * (1 + threshold):
+                regressions.append(f"{name}: {q} latency {current['latency_ms'][q]:.1f} > "
+                                   f"baseline {base['latency_ms'][q]:.1f} ms")
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            regressions.append(f"{name}: error rate {current['error_rate']:.2%} > baseline {base['error_rate']:.2%}")
+    return regressions
+
+
+server = None
+try:
+    if args.url:
+        base_url, server_pid = args.url.rstrip("/"), None
+    else:
+        server, base_url = start_server()
+        server_pid = server.pid
+    print(f"Waiting for {base_url} ...")
+    api_key = wait_ready(base_url, server)
+
+    report = {
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "workers": args.workers,
+            "preload": args.preload,
+            "batch_size": args.batch_size,
+        },
+        "scenarios": {},
+    }
+    for name in args.scenarios:
+        print(f"Running {name} ({args.concurrency} concurrent, {args.duration:.0f}s)...")
+        report["scenarios"][name] = run_scenario(name, base_url, api_key, server_pid)
+finally:
+    if server is not None:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+print(f"\n{'scenario':<14} {'req/s':>8} {'msg/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'CPU %':>7} {'RSS MB':>7}")
+for name, r in report["scenarios"].items():
+    srv = r.get("server", {})
+    print(f"{name:<14} {r['requests_per_sec']:>8.1f} {r['messages_per_sec']:>8.1f} {r['latency_ms']['p50']:>8.1f} "
+          f"{r['latency_ms']['p95']:>8.1f} {r['latency_ms']['p99']:>8.1f} {r['error_rate']:>7.2%} "
+          f"{srv.get('cpu_percent', 0):>7.0f} {srv.get('rss_mb_peak', 0):>7.0f}")
+
+for path in filter(None, (args.output, args.save_baseline)):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+print(f"Report written to {args.output}")
+
+if args.baseline:
+    with open(args.baseline) as f:
+        regressions = compare(report, json.load(f), args.threshold)
+    if regressions:
+        print("\nREGRESSIONS:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\nNo regressions against baseline.")
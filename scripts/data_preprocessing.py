@@ -1,17 +1,27 @@
-import pandas as pd
+import argparse
+import hashlib
+import json
+import os
 import re
-from sklearn.model_selection import train_test_split
-from transformers import BertTokenizer
+from multiprocessing import Pool
 
-data_path = '/Users/vinaykumar/Desktop/My Projects/SMS spam detection/data/raw/spam.csv'  
-df = pd.read_csv(data_path, encoding='latin-1')
+import numpy as np
+import pandas as pd
+from transformers import BertTokenizerFast
+from dataset import BASE_DIR, find_shards, split_paths, save_arrays
 
-# Renaming the columns and selecting relevant ones
-df.columns = ['label', 'message', 'Unnamed: 2', 'Unnamed: 3', 'Unnamed: 4']
-df = df[['label', 'message']]
+# Streaming preprocessing: the raw CSV is read in chunks, each chunk is cleaned
+# and tokenized (once) in a worker process, and rows are appended to per-split
+# shard buffers that are written out as soon as they reach `shard_size`.
+# Memory stays bounded by (workers + 2) chunks plus one shard per split.
+#
+# By default ("legacy") rows are assigned to train/test exactly as the original
+# train_test_split(random_state=42) did, so the checked-in model is never scored
+# on rows it was trained on. "hash" assigns each row by hashing its row number,
+# which needs no row count; it is meant for large corpora, and models trained
+# on "hash" splits must be scored on them too.
 
-# Mapping 'ham' to 0 and 'spam' to 1
-df['label'] = df['label'].map({'ham': 0, 'spam': 1})
+CONFIG_PATH = os.path.join(BASE_DIR, "config", "config.json")
 
 # Text cleaning function
 def clean_text(text):
@@ -20,38 +30,193 @@ def clean_text(text):
     text = text.lower()  # Convert text to lowercase
     return text
 
-# Applying the cleaning function to all messages
-df['message'] = df['message'].apply(clean_text)
+def is_test_row(row_number, test_size, seed):
+    """Deterministic train/test assignment that does not need the whole corpus in memory."""
+    digest = hashlib.blake2b(f"{seed}:{row_number}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64 < test_size
+
+def test_row_selector(input_path, test_size, seed, method="legacy", chunk_size=10000):
+    """Return a function telling whether a raw row number belongs to the test split.
+
+    "legacy" reproduces train_test_split(test_size=..., random_state=seed) over
+    the whole corpus. It needs the row count, so the CSV is read an extra time,
+    and it keeps the test row numbers in memory.
+    """
+    if method == "hash":
+        return lambda row: is_test_row(row, test_size, seed)
+    if method != "legacy":
+        raise ValueError(f"Unknown split method {method!r}")
+    from sklearn.model_selection import train_test_split
+
+    rows = sum(len(numbers) for numbers, _, _ in read_chunks(input_path, chunk_size))
+    _, test_rows = train_test_split(np.arange(rows), test_size=test_size, random_state=seed)
+    test_rows = set(test_rows.tolist())
+    return lambda row: row in test_rows
 
-# Initializing the BERT tokenizer
-tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
+# Each worker process loads its own tokenizer once
+tokenizer = None
+max_length = 128
 
-# Tokenizing the messages
-def tokenize_text(text):
-    return tokenizer.encode_plus(
-        text,
+def init_worker(tokenizer_name, worker_max_length):
+    global tokenizer, max_length
+    tokenizer = BertTokenizerFast.from_pretrained(tokenizer_name)
+    max_length = worker_max_length
+
+def process_chunk(chunk):
+    """Clean and tokenize one chunk. Returns (input_ids, labels, row_numbers)."""
+    row_numbers, labels, messages = chunk
+    cleaned = [clean_text(m) for m in messages]
+    input_ids = tokenizer(
+        cleaned,
         add_special_tokens=True,  # Add [CLS] and [SEP]
-        max_length=128,           # Max length based on dataset analysis
-        pad_to_max_length=True,   # Pad to max length
-        return_attention_mask=True,
-        truncation=True           # Truncate to max length
+        max_length=max_length,
+        truncation=True,
+        return_attention_mask=False  # Masks are derived from lengths at load time
+    )["input_ids"]
+    return input_ids, labels, row_numbers
+
+def read_chunks(path, chunk_size):
+    """Yield (row_numbers, labels, messages) chunks from the raw spam CSV."""
+    reader = pd.read_csv(
+        path,
+        encoding='latin-1',
+        usecols=[0, 1],
+        names=['label', 'message'],
+        header=0,
+        chunksize=chunk_size,
+        dtype=str,
+        keep_default_na=False
     )
+    row = 0
+    for df in reader:
+        # Mapping 'ham' to 0 and 'spam' to 1, skipping anything else
+        df['label'] = df['label'].map({'ham': 0, 'spam': 1})
+        df = df.dropna(subset=['label'])
+        numbers = list(range(row, row + len(df)))
+        row += len(df)
+        yield numbers, df['label'].astype(int).tolist(), df['message'].tolist()
+
+def load_config():
+    """The `preprocessing` section of config/config.json ({} if the file is empty)."""
+    with open(CONFIG_PATH) as f:
+        text = f.read().strip()
+    return json.loads(text).get("preprocessing", {}) if text else {}
+
+def read_split_texts(input_path, test_size, seed, split_method="legacy", chunk_size=10000, splits=("train", "test")):
+    """Raw {split: (messages, labels)} for the requested splits, in the row order main() writes them."""
+    is_test = test_row_selector(input_path, test_size, seed, split_method, chunk_size)
+    result = {split: ([], []) for split in splits}
+    for row_numbers, labels, messages in read_chunks(input_path, chunk_size):
+        for row, label, message in zip(row_numbers, labels, messages):
+            split = "test" if is_test(row) else "train"
+            if split in result:
+                result[split][0].append(message)
+                result[split][1].append(label)
+    return result
+
+class ShardWriter:
+    """Buffers rows for one split and writes a numbered shard every `shard_size` rows.
+
+    Rows go straight into padded int32 arrays. These start small and double up
+    to `shard_size` rows, and are reused for every shard.
+    """
+
+    def __init__(self, output_dir, split, shard_size, max_length):
+        self.output_dir = output_dir
+        self.split = split
+        self.shard_size = shard_size
+        self.max_length = max_length
+        self.input_ids = np.zeros((min(shard_size, 4096), max_length), dtype=np.int32)
+        self.lengths = np.zeros(len(self.input_ids), dtype=np.int32)
+        self.labels = np.zeros(len(self.input_ids), dtype=np.int64)
+        self.count = 0
+        self.shards = 0
+        self.rows = 0
+        # Remove shards from a previous run so they are not loaded with the new ones
+        for prefix in find_shards(output_dir, split):
+            for path in split_paths(output_dir, prefix).values():
+                os.remove(path)
+
+    def _grow(self):
+        capacity = min(self.shard_size, 2 * len(self.labels))
+        self.input_ids = np.resize(self.input_ids, (capacity, self.max_length))
+        self.lengths = np.resize(self.lengths, capacity)
+        self.labels = np.resize(self.labels, capacity)
+
+    def add(self, ids, label):
+        if self.count == len(self.labels):
+            self._grow()
+        ids = ids[:self.max_length]
+        row = self.input_ids[self.count]
+        row[:len(ids)] = ids
+        row[len(ids):] = 0  # The buffer is reused, so clear the previous shard's tokens
+        self.lengths[self.count] = len(ids)
+        self.labels[self.count] = label
+        self.count += 1
+        if self.count >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        if not self.count:
+            return
+        n = self.count
+        save_arrays(self.output_dir, f"{self.split}-{self.shards:05d}",
+                    self.input_ids[:n], self.lengths[:n], self.labels[:n])
+        self.rows += n
+        self.shards += 1
+        self.count = 0
+
+def main():
+    defaults = load_config()
+
+    parser = argparse.ArgumentParser(description="Clean, tokenize and shard the raw SMS corpus.")
+    parser.add_argument("--input", default=defaults.get("input", "data/raw/spam.csv"))
+    parser.add_argument("--output-dir", default=defaults.get("output_dir", "data/processed"))
+    parser.add_argument("--tokenizer", default=defaults.get("tokenizer", "bert-base-uncased"))
+    parser.add_argument("--max-length", type=int, default=defaults.get("max_length", 128))
+    parser.add_argument("--test-size", type=float, default=defaults.get("test_size", 0.2))
+    parser.add_argument("--seed", type=int, default=defaults.get("seed", 42))
+    parser.add_argument("--chunk-size", type=int, default=defaults.get("chunk_size", 10000))
+    parser.add_argument("--shard-size", type=int, default=defaults.get("shard_size", 250000))
+    parser.add_argument("--split-method", choices=["hash", "legacy"], default=defaults.get("split_method", "legacy"),
+                        help="legacy: the original train_test_split test set; hash: per-row hash assignment for large corpora")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    # Relative paths are relative to the repository root
+    input_path = os.path.join(BASE_DIR, args.input)
+    output_dir = os.path.join(BASE_DIR, args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    is_test = test_row_selector(input_path, args.test_size, args.seed, args.split_method, args.chunk_size)
+    writers = {
+        split: ShardWriter(output_dir, split, args.shard_size, args.max_length)
+        for split in ("train", "test")
+    }
 
-# Tokenizing the dataset
-df['tokenized'] = df['message'].apply(lambda x: tokenize_text(x)['input_ids'])
-df['attention_mask'] = df['message'].apply(lambda x: tokenize_text(x)['attention_mask'])
+    with Pool(args.workers, initializer=init_worker, initargs=(args.tokenizer, args.max_length)) as pool:
+        pending = []
+        chunks = read_chunks(input_path, args.chunk_size)
 
-# Splitting the data into training and test sets
-X = df[['tokenized', 'attention_mask']]
-y = df['label']
+        def drain():
+            input_ids, labels, row_numbers = pending.pop(0).get()
+            for ids, label, row in zip(input_ids, labels, row_numbers):
+                split = "test" if is_test(row) else "train"
+                writers[split].add(ids, label)
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        # Keep a bounded number of chunks in flight; results are consumed in order
+        for chunk in chunks:
+            pending.append(pool.apply_async(process_chunk, (chunk,)))
+            if len(pending) >= args.workers + 2:
+                drain()
+        while pending:
+            drain()
 
-# Saving processed data
-train_data = pd.concat([X_train, y_train], axis=1)
-test_data = pd.concat([X_test, y_test], axis=1)
+    for writer in writers.values():
+        writer.flush()
+        print(f"{writer.split}: {writer.rows} rows in {writer.shards} shard(s)")
 
-train_data.to_csv('/Users/vinaykumar/Desktop/My Projects/SMS spam detection/data/processed/train_data.csv', index=False)
-test_data.to_csv('/Users/vinaykumar/Desktop/My Projects/SMS spam detection/data/processed/test_data.csv', index=False)
+    print(f"Data preprocessing complete. Processed data saved to {output_dir}.")
 
-print("Data preprocessing complete. Processed data saved to the 'processed' folder.")
+if __name__ == "__main__":
+    main()
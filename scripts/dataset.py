@@ -0,0 +1,197 @@
+import bisect
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset, Sampler
+
+# Binary tokenized dataset format
+#
+# Each split is stored as three .npy files in the processed data directory:
+#   <split>_input_ids.npy  int32 [N, max_length]  token ids, zero padded
+#   <split>_lengths.npy    int32 [N]              real token count per row
+#   <split>_labels.npy     int64 [N]              0 = ham, 1 = spam
+# Attention masks are not stored; they are derived from the lengths.
+# Large corpora are written as numbered shards (<split>-00000_input_ids.npy,
+# ...), which load as one dataset.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROCESSED_DIR = os.path.join(BASE_DIR, "data", "processed")
+MAX_LENGTH = 128
+
+
+def split_paths(data_dir, split):
+    return {
+        field: os.path.join(data_dir, f"{split}_{field}.npy")
+        for field in ("input_ids", "lengths", "labels")
+    }
+
+
+def save_split(data_dir, split, input_ids, labels, max_length=MAX_LENGTH):
+    """Write unpadded token id lists and labels as a binary split."""
+    ids = np.zeros((len(input_ids), max_length), dtype=np.int32)
+    lengths = np.zeros(len(input_ids), dtype=np.int32)
+    for i, row in enumerate(input_ids):
+        row = row[:max_length]
+        ids[i, :len(row)] = row
+        lengths[i] = len(row)
+    return save_arrays(data_dir, split, ids, lengths, labels)
+
+
+def save_arrays(data_dir, split, ids, lengths, labels):
+    """Write already padded id, length and label arrays as a binary split."""
+    os.makedirs(data_dir, exist_ok=True)
+    paths = split_paths(data_dir, split)
+    np.save(paths["input_ids"], np.asarray(ids, dtype=np.int32))
+    np.save(paths["lengths"], np.asarray(lengths, dtype=np.int32))
+    np.save(paths["labels"], np.asarray(labels, dtype=np.int64))
+    return paths
+
+
+def find_shards(data_dir, split):
+    """Return the file prefixes (`<split>` or `<split>-NNNNN`) that make up a split."""
+    if os.path.exists(split_paths(data_dir, split)["input_ids"]):
+        return [split]
+    pattern = os.path.join(data_dir, f"{split}-*_input_ids.npy")
+    return sorted(os.path.basename(p)[:-len("_input_ids.npy")] for p in glob.glob(pattern))
+
+
+class TokenizedSplit(Dataset):
+    """Memory-mapped view of a binary split, possibly spread over several shards.
+
+    Arrays are opened copy-on-write, so tensors built with `torch.from_numpy`
+    share the page cache instead of copying the data into the process.
+    """
+
+    def __init__(self, data_dir, split):
+        shards = find_shards(data_dir, split)
+        if not shards:
+            raise FileNotFoundError(
+                f"No '{split}' split in {data_dir}; run scripts/data_preprocessing.py "
+                f"(or convert the old CSVs with scripts/dataset.py)"
+            )
+        self.shard_ids, lengths, labels = [], [], []
+        for shard in shards:
+            paths = split_paths(data_dir, shard)
+            self.shard_ids.append(torch.from_numpy(np.load(paths["input_ids"], mmap_mode="c")))
+            lengths.append(torch.from_numpy(np.load(paths["lengths"], mmap_mode="c")))
+            labels.append(torch.from_numpy(np.load(paths["labels"], mmap_mode="c")))
+        # Lengths and labels are small; a single shard stays zero-copy
+        self.lengths = lengths[0] if len(lengths) == 1 else torch.cat(lengths)
+        self.labels = labels[0] if len(labels) == 1 else torch.cat(labels)
+        self._offsets = np.cumsum([0] + [len(ids) for ids in self.shard_ids]).tolist()
+        self._positions = torch.arange(self.shard_ids[0].shape[1])
+
+    @property
+    def input_ids(self):
+        """All token ids as one [N, max_length] tensor (copies only when sharded)."""
+        return self.shard_ids[0] if len(self.shard_ids) == 1 else torch.cat(self.shard_ids)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, index):
+        shard = bisect.bisect_right(self._offsets, index) - 1
+        ids = self.shard_ids[shard][index - self._offsets[shard]]
+        mask = (self._positions < self.lengths[index]).long()
+        return ids.long(), mask, self.labels[index]
+
+
+def load_split(split, data_dir=PROCESSED_DIR):
+    return TokenizedSplit(data_dir, split)
+
+
+class EpochBatchSampler(Sampler):
+    """Deterministic per-epoch batch order that can start part-way through an epoch.
+
+    The order depends only on `seed` and the epoch passed to `set_epoch`, so a
+    resumed run that skips `start_batch` batches sees exactly the batches the
+    interrupted run had not reached yet.
+    """
+
+    def __init__(self, num_rows, batch_size, seed=42):
+        self.num_rows = num_rows
+        self.batch_size = batch_size
+        self.seed = seed
+        self.epoch = 0
+        self.start_batch = 0
+
+    def set_epoch(self, epoch, start_batch=0):
+        self.epoch = epoch
+        self.start_batch = start_batch
+
+    def batches(self):
+        raise NotImplementedError
+
+    def __iter__(self):
+        return iter(self.batches()[self.start_batch:])
+
+    def __len__(self):
+        return (self.num_rows + self.batch_size - 1) // self.batch_size
+
+
+class ShuffledBatchSampler(EpochBatchSampler):
+    """Plain shuffled batches (the original fixed-padding data path)."""
+
+    def batches(self):
+        order = np.random.default_rng(self.seed + self.epoch).permutation(self.num_rows)
+        return [order[i:i + self.batch_size].tolist() for i in range(0, len(order), self.batch_size)]
+
+
+class LengthGroupedSampler(EpochBatchSampler):
+    """Batch sampler that groups rows of similar token length.
+
+    Each epoch the rows are shuffled, cut into pools of `batch_size *
+    pool_batches`, each pool is sorted by length and split into batches, and
+    the batch order is shuffled again. Batches stay random across the corpus
+    but need far less padding.
+    """
+
+    def __init__(self, lengths, batch_size, pool_batches=50, seed=42):
+        super().__init__(len(lengths), batch_size, seed)
+        self.lengths = np.asarray(lengths)
+        self.pool_size = batch_size * pool_batches
+
+    def batches(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        order = rng.permutation(len(self.lengths))
+        batches = []
+        for start in range(0, len(order), self.pool_size):
+            pool = order[start:start + self.pool_size]
+            pool = pool[np.argsort(self.lengths[pool], kind="stable")]
+            batches.extend(pool[i:i + self.batch_size].tolist() for i in range(0, len(pool), self.batch_size))
+        rng.shuffle(batches)
+        return batches
+
+
+def collate_dynamic(batch):
+    """Stack (input_ids, mask, label) rows, trimmed to the longest row in the batch."""
+    input_ids = torch.stack([row[0] for row in batch])
+    masks = torch.stack([row[1] for row in batch])
+    labels = torch.stack([row[2] for row in batch])
+    length = int(masks.sum(dim=1).max())
+    return input_ids[:, :length], masks[:, :length], labels
+
+
+def convert_csv(csv_path, data_dir=PROCESSED_DIR, split=None):
+    """One-off conversion of the old stringified-list CSV format."""
+    import csv
+
+    split = split or os.path.basename(csv_path).replace("_data.csv", "")
+    input_ids, labels = [], []
+    with open(csv_path, newline="") as f:
+        for row in csv.DictReader(f):
+            ids = json.loads(row["tokenized"])
+            length = sum(json.loads(row["attention_mask"]))
+            input_ids.append(ids[:length])
+            labels.append(int(row["label"]))
+    return save_split(data_dir, split, input_ids, labels)
+
+
+if __name__ == "__main__":
+    # python scripts/dataset.py data/processed/train_data.csv data/processed/test_data.csv
+    for path in sys.argv[1:]:
+        print(f"{path} -> {convert_csv(path)['input_ids']}")
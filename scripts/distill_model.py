@@ -0,0 +1,192 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import time
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from transformers import BertConfig, BertForSequenceClassification, BertTokenizer
+from sklearn.metrics import f1_score
+from sklearn.utils.class_weight import compute_class_weight
+from dataset import BASE_DIR, LengthGroupedSampler, collate_dynamic, load_split
+
+# Knowledge distillation: trains a smaller BERT student on the train split, from
+# the fine-tuned teacher's logits (softened by --temperature) together with the
+# true labels. Both loss terms use the same balanced class weights as
+# model_training.py. With the teacher's hidden size, the student starts from an
+# evenly spaced subset of the teacher's layers. With a smaller hidden size, it
+# starts from random weights.
+#
+#   python scripts/distill_model.py --layers 4
+#   SPAM_MODEL_PATH=models/bert_spam_student uvicorn app.main:app
+
+parser = argparse.ArgumentParser(description="Distill the fine-tuned BERT spam model into a smaller student.")
+parser.add_argument("--teacher-path", default=os.path.join(BASE_DIR, "models", "bert_spam_model_weighted"))
+parser.add_argument("--output-dir", default=os.path.join(BASE_DIR, "models", "bert_spam_student"))
+parser.add_argument("--layers", type=int, default=4, help="Student transformer layers")
+parser.add_argument("--hidden-size", type=int, default=0, help="Student hidden size (0 = the teacher's)")
+parser.add_argument("--epochs", type=int, default=3)
+parser.add_argument("--batch-size", type=int, default=32)
+parser.add_argument("--lr", type=float, default=5e-5)
+parser.add_argument("--temperature", type=float, default=2.0)
+parser.add_argument("--alpha", type=float, default=0.5, help="Weight of the hard-label loss (the rest is distillation)")
+parser.add_argument("--bf16", action="store_true", help="CPU bf16 autocast for the forward passes")
+parser.add_argument("--eval-split", default="test")
+parser.add_argument("--seed", type=int, default=42)
+args = parser.parse_args()
+
+torch.manual_seed(args.seed)
+random.seed(args.seed)
+np.random.seed(args.seed)
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+def autocast():
+    if args.bf16:
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+def batch_of(data, indices):
+    input_ids, masks, labels = collate_dynamic([data[i] for i in indices])
+    return input_ids.to(device), masks.to(device), labels.to(device)
+
+train_data = load_split('train')
+eval_data = load_split(args.eval_split)
+
+# Calculating the class weights based on the label distribution, as in model_training.py
+class_weights = compute_class_weight('balanced', classes=[0, 1], y=train_data.labels.numpy())
+class_weights = torch.tensor(class_weights, dtype=torch.float).to(device)
+
+teacher = BertForSequenceClassification.from_pretrained(args.teacher_path).to(device)
+teacher.eval()
+
+def build_student():
+    config = teacher.config.to_dict()
+    config["num_hidden_layers"] = args.layers
+    if args.hidden_size and args.hidden_size != teacher.config.hidden_size:
+        config["hidden_size"] = args.hidden_size
+        config["intermediate_size"] = 4 * args.hidden_size
+        config["num_attention_heads"] = max(1, args.hidden_size // 64)
+        print(f"Student: {args.layers} layers, hidden size {args.hidden_size} (random init)")
+        return BertForSequenceClassification(BertConfig(**config))
+
+    student = BertForSequenceClassification(BertConfig(**config))
+    # Same width: copy the embeddings, pooler, classifier and evenly spaced teacher layers
+    keep = np.linspace(0, teacher.config.num_hidden_layers - 1, args.layers).round().astype(int).tolist()
+    state = teacher.state_dict()
+    student_state = {}
+    for name in student.state_dict():
+        source = name
+        if ".encoder.layer." in name:
+            prefix, rest = name.split(".encoder.layer.", 1)
+            index, suffix = rest.split(".", 1)
+            source = f"{prefix}.encoder.layer.{keep[int(index)]}.{suffix}"
+        student_state[name] = state[source]
+    student.load_state_dict(student_state)
+    print(f"Student: {args.layers} layers initialized from teacher layers {keep}")
+    return student
+
+# The teacher's logits are computed once; they do not change between epochs
+print("Computing teacher logits on the train split...")
+teacher_logits = torch.zeros((len(train_data), 2), dtype=torch.float)
+logit_sampler = LengthGroupedSampler(train_data.lengths.numpy(), 64, seed=args.seed)
+with torch.no_grad():
+    for indices in logit_sampler:
+        input_ids, masks, _ = batch_of(train_data, indices)
+        with autocast():
+            teacher_logits[indices] = teacher(input_ids, attention_mask=masks).logits.float().cpu()
+
+student = build_student().to(device)
+optimizer = torch.optim.AdamW(student.parameters(), lr=args.lr)
+sampler = LengthGroupedSampler(train_data.lengths.numpy(), args.batch_size, seed=args.seed)
+
+def distillation_loss(student_logits, target_logits, labels):
+    # Hard-label term: the class-weighted cross entropy used to train the teacher
+    hard = F.cross_entropy(student_logits, labels, weight=class_weights)
+    # Soft-label term, weighted per example by the same class weights; T^2 keeps its gradient scale
+    t = args.temperature
+    kl = F.kl_div(F.log_softmax(student_logits / t, dim=1), F.softmax(target_logits / t, dim=1), reduction="none").sum(dim=1)
+    weights = class_weights[labels]
+    soft = (kl * weights).sum() / weights.sum() * t * t
+    return args.alpha * hard + (1.0 - args.alpha) * soft
+
+for epoch in range(args.epochs):
+    student.train()
+    sampler.set_epoch(epoch)
+    total_loss = 0
+    started = time.perf_counter()
+    for indices in sampler:
+        input_ids, masks, labels = batch_of(train_data, indices)
+        with autocast():
+            logits = student(input_ids, attention_mask=masks).logits
+        # Loss in fp32 so the class weights are applied at full precision
+        loss = distillation_loss(logits.float(), teacher_logits[indices].to(device), labels)
+        total_loss += loss.item()
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+    print(f"Epoch {epoch + 1} Loss: {total_loss / len(sampler)} Time: {time.perf_counter() - started:.1f}s")
+
+# Saving the student and the teacher's tokenizer
+student.save_pretrained(args.output_dir, safe_serialization=True)
+BertTokenizer.from_pretrained(args.teacher_path).save_pretrained(args.output_dir)
+print(f"Student saved to {args.output_dir}")
+
+# --- Student vs teacher: spam F1, size and CPU latency ---
+
+def spam_f1(model):
+    model.eval()
+    predictions = []
+    eval_sampler = LengthGroupedSampler(eval_data.lengths.numpy(), 64, seed=args.seed)
+    order = []
+    with torch.no_grad():
+        for indices in eval_sampler:
+            input_ids, masks, _ = batch_of(eval_data, indices)
+            predictions.append(torch.argmax(model(input_ids, attention_mask=masks).logits, dim=1).cpu().numpy())
+            order.extend(indices)
+    return f1_score(eval_data.labels.numpy()[order], np.concatenate(predictions), pos_label=1)
+
+def latency_ms(model, batch_size, repeats=20):
+    """Median CPU forward time for `batch_size` messages of the split's median length."""
+    model = model.to("cpu").eval()
+    length = int(np.median(eval_data.lengths.numpy()))
+    input_ids = torch.full((batch_size, length), 1000, dtype=torch.long)
+    masks = torch.ones_like(input_ids)
+    times = []
+    with torch.no_grad():
+        model(input_ids, attention_mask=masks)
+        for _ in range(repeats):
+            began = time.perf_counter()
+            model(input_ids, attention_mask=masks)
+            times.append(time.perf_counter() - began)
+    return 1000.0 * float(np.median(times))
+
+def size_mb(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+               if name.endswith((".safetensors", ".bin"))) / 1e6
+
+report = {}
+for name, model, path in (("teacher", teacher, args.teacher_path), ("student", student, args.output_dir)):
+    report[name] = {
+        "path": path,
+        "layers": model.config.num_hidden_layers,
+        "hidden_size": model.config.hidden_size,
+        "parameters_m": sum(p.numel() for p in model.parameters()) / 1e6,
+        "size_mb": size_mb(path),
+        "spam_f1": float(spam_f1(model.to(device))),
+        "latency_ms_batch_1": latency_ms(model, 1),
+        "latency_ms_batch_32": latency_ms(model, 32),
+    }
+
+print(f"\n{'model':<8} {'layers':>6} {'hidden':>6} {'params M':>9} {'size MB':>8} {'spam F1':>8} {'b=1 ms':>8} {'b=32 ms':>8}")
+for name, r in report.items():
+    print(f"{name:<8} {r['layers']:>6} {r['hidden_size']:>6} {r['parameters_m']:>9.1f} {r['size_mb']:>8.0f} "
+          f"{r['spam_f1']:>8.4f} {r['latency_ms_batch_1']:>8.2f} {r['latency_ms_batch_32']:>8.2f}")
+speedup = report["teacher"]["latency_ms_batch_1"] / report["student"]["latency_ms_batch_1"]
+print(f"Student is {speedup:.1f}x faster at batch size 1, "
+      f"spam F1 {report['student']['spam_f1'] - report['teacher']['spam_f1']:+.4f} vs the teacher")
+
+with open(os.path.join(args.output_dir, "distillation_report.json"), "w") as f:
+    json.dump({"args": vars(args), **report}, f, indent=2)
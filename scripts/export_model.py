@@ -0,0 +1,93 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from sklearn.metrics import accuracy_score, recall_score
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from app.backends import BACKENDS, SAFETENSORS_FILENAME, export_onnx, export_safetensors, load_backend  # noqa: E402
+from dataset import PROCESSED_DIR, load_split  # noqa: E402
+
+# Exports the safetensors and ONNX / int8 ONNX artifacts next to the fine-tuned
+# weights, then checks that every inference backend agrees with fp32 on the test split.
+
+parser = argparse.ArgumentParser(description="Export and validate CPU inference backends.")
+parser.add_argument("--model-path", default=os.path.join(BASE_DIR, "models", "bert_spam_model_weighted"))
+parser.add_argument("--data-dir", default=PROCESSED_DIR, help="Directory with the binary test split")
+parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+parser.add_argument("--batch-size", type=int, default=32)
+parser.add_argument("--threads", type=int, default=0, help="torch / onnxruntime intra-op threads (0 = default)")
+parser.add_argument("--max-recall-drop", type=float, default=0.01, help="Allowed spam recall loss vs fp32")
+parser.add_argument("--skip-export", action="store_true", help="Validate existing artifacts only")
+args = parser.parse_args()
+
+if args.threads > 0:
+    torch.set_num_threads(args.threads)
+
+if not args.skip_export and not os.path.exists(os.path.join(args.model_path, SAFETENSORS_FILENAME)):
+    print(f"Converting weights to {SAFETENSORS_FILENAME}...")
+    print(f"  {export_safetensors(args.model_path)}")
+
+if not args.skip_export and any(b.startswith("onnx") for b in args.backends):
+    print(f"Exporting ONNX artifacts to {args.model_path}...")
+    for path in export_onnx(args.model_path):
+        print(f"  {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+# Loading the test split
+test_data = load_split("test", args.data_dir)
+input_ids = test_data.input_ids.long()
+masks = (torch.arange(input_ids.shape[1]) < test_data.lengths[:, None]).long()
+labels = test_data.labels.numpy()
+
+
+def run_backend(model, device):
+    """Returns predictions and total forward-pass time over the test split."""
+    predictions = []
+    elapsed = 0.0
+    for start in range(0, len(input_ids), args.batch_size):
+        batch_masks = masks[start:start + args.batch_size]
+        # Trim the fixed 128-token padding down to the longest message in the batch
+        length = int(batch_masks.sum(dim=1).max())
+        batch_ids = input_ids[start:start + args.batch_size, :length].to(device)
+        batch_masks = batch_masks[:, :length].to(device)
+
+        began = time.perf_counter()
+        with torch.no_grad():
+            logits = model(input_ids=batch_ids, attention_mask=batch_masks).logits
+        elapsed += time.perf_counter() - began
+        predictions.append(torch.argmax(logits, dim=1).cpu().numpy())
+    return np.concatenate(predictions), elapsed
+
+
+backends = ["fp32"] + [b for b in args.backends if b != "fp32"]
+results = {}
+for backend in backends:
+    model, device = load_backend(args.model_path, backend, args.threads)
+    predictions, elapsed = run_backend(model, device)
+    results[backend] = {
+        "predictions": predictions,
+        "accuracy": accuracy_score(labels, predictions),
+        "spam_recall": recall_score(labels, predictions, pos_label=1),
+        "ms_per_message": 1000.0 * elapsed / len(labels),
+    }
+    del model
+
+baseline = results["fp32"]
+failed = False
+print(f"\n{'backend':<10} {'accuracy':>9} {'spam rec':>9} {'agree':>7} {'ms/msg':>8} {'speedup':>8}")
+for backend in backends:
+    r = results[backend]
+    agreement = float(np.mean(r["predictions"] == baseline["predictions"]))
+    speedup = baseline["ms_per_message"] / r["ms_per_message"]
+    print(f"{backend:<10} {r['accuracy']:>9.4f} {r['spam_recall']:>9.4f} {agreement:>7.2%} "
+          f"{r['ms_per_message']:>8.2f} {speedup:>7.2f}x")
+    if r["spam_recall"] < baseline["spam_recall"] - args.max_recall_drop:
+        print(f"  FAILED: {backend} loses more than {args.max_recall_drop:.2%} spam recall vs fp32")
+        failed = True
+
+sys.exit(1 if failed else 0)
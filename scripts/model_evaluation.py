@@ -1,58 +1,201 @@
-from transformers import BertForSequenceClassification, BertTokenizer
-import torch
-from torch.utils.data import DataLoader, TensorDataset
-from sklearn.metrics import classification_report
-import pandas as pd
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
 import numpy as np
+import torch
+from torch.utils.data import DataLoader, Subset
+from sklearn.metrics import accuracy_score, classification_report, confusion_matrix, precision_recall_fscore_support
+from dataset import BASE_DIR, PROCESSED_DIR, collate_dynamic, load_split
+
+sys.path.insert(0, BASE_DIR)
+from app.backends import BACKENDS, load_backend  # noqa: E402
+from app.cascade import CASCADE_PATH, FirstStageFilter  # noqa: E402
+
+# Evaluates quality and speed together: every backend is run over the split at
+# each thread count and batch size, and accuracy / per-class precision and
+# recall / confusion matrix are reported next to throughput, per-batch latency
+# percentiles and peak memory. Results are written as JSON for comparison.
+# Peak RSS only ever grows within a process, so when several backends or
+# thread counts are requested each one is measured in its own subprocess.
+# With --cascade, every configuration is also run behind the first-stage
+# filter (app/cascade.py), which shows what the cascade trades in accuracy
+# for throughput.
 
-# Loading the test data
-test_data = pd.read_csv('/Users/vinaykumar/Desktop/My Projects/SMS spam detection/data/processed/test_data.csv')
+parser = argparse.ArgumentParser(description="Quality and throughput evaluation of spam model candidates.")
+parser.add_argument("--model-path", default=os.path.join(BASE_DIR, "models", "bert_spam_model_weighted"))
+parser.add_argument("--data-dir", default=PROCESSED_DIR)
+parser.add_argument("--split", default="test")
+parser.add_argument("--backends", nargs="+", default=["fp32"], choices=BACKENDS)
+parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 16, 32])
+parser.add_argument("--threads", nargs="+", type=int, default=[torch.get_num_threads()])
+parser.add_argument("--output", default=os.path.join(BASE_DIR, "evaluation_results.json"))
+parser.add_argument("--cascade", action="store_true", help="Also evaluate each configuration behind the first-stage filter")
+parser.add_argument("--cascade-path", default=CASCADE_PATH)
+args = parser.parse_args()
 
-# Prepareing the test inputs
-X_test = np.array([eval(i) for i in test_data['tokenized'].values])
-attention_masks_test = np.array([eval(i) for i in test_data['attention_mask'].values])
-y_test = test_data['label'].values
+test_data = load_split(args.split, args.data_dir)
 
-# Converting to the tensors
-test_inputs = torch.tensor(X_test)
-test_labels = torch.tensor(y_test)
-test_masks = torch.tensor(attention_masks_test)
+def load_split_texts(split):
+    """Raw messages of a split, in the order data_preprocessing.py wrote them."""
+    from data_preprocessing import load_config, read_split_texts
 
-# Creating the test dataloader
-batch_size = 16
-test_data = TensorDataset(test_inputs, test_masks, test_labels)
-test_dataloader = DataLoader(test_data, shuffle=False, batch_size=batch_size)
+    config = load_config()
+    texts, labels = read_split_texts(
+        os.path.join(BASE_DIR, config.get("input", "data/raw/spam.csv")), config.get("test_size", 0.2),
+        config.get("seed", 42), config.get("split_method", "legacy"), splits=(split,)
+    )[split]
+    if not np.array_equal(np.array(labels), test_data.labels.numpy()):
+        sys.exit(f"Raw {split} messages do not line up with {args.data_dir}; re-run data_preprocessing.py")
+    return texts
 
-# Loading the new model and the tokenizer from bert_spam_model_weighted
-model = BertForSequenceClassification.from_pretrained('/Users/vinaykumar/Desktop/My Projects/SMS spam detection/models/bert_spam_model_weighted')
-tokenizer = BertTokenizer.from_pretrained('/Users/vinaykumar/Desktop/My Projects/SMS spam detection/models/bert_spam_model_weighted')
+first_stage, split_texts = None, None
+if args.cascade:
+    first_stage = FirstStageFilter.load(args.cascade_path)
+    split_texts = load_split_texts(args.split)
 
-# Seting the device as (GPU/CPU)
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
+def peak_rss_mb():
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS).
 
-# Evaluation
-model.eval()
-predictions, true_labels = [], []
+    Covers a single backend/thread configuration, since each runs in its own process.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
 
-for batch in test_dataloader:
-    batch = tuple(t.to(device) for t in batch)
-    inputs, masks, labels = batch
-    
+def quality(true_labels, predictions):
+    precision, recall, f1, _ = precision_recall_fscore_support(true_labels, predictions, labels=[0, 1], zero_division=0)
+    return {
+        "accuracy": float(accuracy_score(true_labels, predictions)),
+        "precision": {"ham": float(precision[0]), "spam": float(precision[1])},
+        "recall": {"ham": float(recall[0]), "spam": float(recall[1])},
+        "f1": {"ham": float(f1[0]), "spam": float(f1[1])},
+        "confusion_matrix": confusion_matrix(true_labels, predictions, labels=[0, 1]).tolist(),
+    }
+
+def evaluate(model, device, batch_size, data=None):
+    # Batches are built up front so data loading is not part of the latency
+    data = test_data if data is None else data
+    batches = list(DataLoader(data, batch_size=batch_size, shuffle=False, collate_fn=collate_dynamic))
+
+    # Warm-up pass (lazy kernel initialization, allocator growth)
     with torch.no_grad():
-        outputs = model(inputs, token_type_ids=None, attention_mask=masks)
-    
-    logits = outputs.logits
-    logits = logits.detach().cpu().numpy()
-    label_ids = labels.to('cpu').numpy()
-    
-    predictions.append(np.argmax(logits, axis=1))
-    true_labels.append(label_ids)
-
-# Flattening the predictions and the true labels
-predictions = np.concatenate(predictions, axis=0)
-true_labels = np.concatenate(true_labels, axis=0)
-
-# Generating the classification report
-report = classification_report(true_labels, predictions, target_names=['Ham', 'Spam'])
-print(report)
+        model(input_ids=batches[0][0].to(device), attention_mask=batches[0][1].to(device))
+
+    predictions, true_labels, latencies = [], [], []
+    started = time.perf_counter()
+    for inputs, masks, labels in batches:
+        began = time.perf_counter()
+        with torch.no_grad():
+            logits = model(input_ids=inputs.to(device), attention_mask=masks.to(device)).logits
+        predictions.append(torch.argmax(logits, dim=1).cpu().numpy())
+        latencies.append(time.perf_counter() - began)
+        true_labels.append(labels.numpy())
+    elapsed = time.perf_counter() - started
+
+    predictions = np.concatenate(predictions, axis=0)
+    true_labels = np.concatenate(true_labels, axis=0)
+    latencies_ms = np.array(latencies) * 1000.0
+
+    return predictions, true_labels, {
+        **quality(true_labels, predictions),
+        "messages_per_sec": len(true_labels) / elapsed,
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()),
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+            "p99": float(np.percentile(latencies_ms, 99)),
+        },
+    }
+
+def evaluate_cascade(model, device, batch_size, true_labels):
+    """Filter every message, send only the deferred ones to BERT, and score the combined answers."""
+    started = time.perf_counter()
+    decisions = first_stage.decide_many(split_texts)
+    filter_seconds = time.perf_counter() - started
+
+    predictions = np.array([1 if d == "Spam" else 0 for d in decisions])
+    deferred = [i for i, d in enumerate(decisions) if d is None]
+    bert_seconds, latency_ms = 0.0, None
+    if deferred:
+        bert_predictions, _, bert_metrics = evaluate(model, device, batch_size, Subset(test_data, deferred))
+        predictions[deferred] = bert_predictions
+        bert_seconds = len(deferred) / bert_metrics["messages_per_sec"]
+        latency_ms = bert_metrics["latency_ms"]
+
+    return {
+        **quality(true_labels, predictions),
+        "messages_per_sec": len(true_labels) / (filter_seconds + bert_seconds),
+        # Per-batch latency of the BERT stage only
+        "latency_ms": latency_ms,
+        "filter_fraction": 1.0 - len(deferred) / len(true_labels),
+        "filter_us_per_message": 1e6 * filter_seconds / len(true_labels),
+    }
+
+def run_isolated(backend, threads):
+    """Evaluate one backend/thread configuration in a fresh process and return its results."""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "results.json")
+        # Later occurrences of an option override the ones from the original command line
+        subprocess.run([sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--backends", backend,
+                        "--threads", str(threads), "--output", output], check=True)
+        with open(output) as f:
+            return json.load(f)["results"]
+
+results = []
+if len(args.backends) * len(args.threads) > 1:
+    for backend in args.backends:
+        for threads in args.threads:
+            results.extend(run_isolated(backend, threads))
+else:
+    for backend in args.backends:
+        for threads in args.threads:
+            torch.set_num_threads(threads)
+            # onnxruntime fixes its thread count when the session is created
+            model, device = load_backend(args.model_path, backend, threads)
+            for batch_size in args.batch_sizes:
+                predictions, true_labels, metrics = evaluate(model, device, batch_size)
+                metrics.update({
+                    "backend": backend,
+                    "threads": threads,
+                    "batch_size": batch_size,
+                    "peak_rss_mb": peak_rss_mb(),
+                })
+                results.append(metrics)
+                if len(results) == 1:
+                    # Generating the classification report
+                    print(classification_report(true_labels, predictions, target_names=['Ham', 'Spam']))
+                if first_stage is not None:
+                    cascade_metrics = evaluate_cascade(model, device, batch_size, true_labels)
+                    cascade_metrics.update({
+                        "backend": f"{backend}+filter",
+                        "threads": threads,
+                        "batch_size": batch_size,
+                        "peak_rss_mb": peak_rss_mb(),
+                    })
+                    results.append(cascade_metrics)
+            del model
+
+print(f"{'backend':<17} {'thr':>4} {'batch':>6} {'acc':>7} {'spam P':>7} {'spam R':>7} "
+      f"{'msg/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MB':>8} {'filtered':>9}")
+for r in results:
+    latency = r["latency_ms"] or {"p50": float("nan"), "p95": float("nan"), "p99": float("nan")}
+    filtered = f"{r['filter_fraction']:>9.1%}" if "filter_fraction" in r else f"{'-':>9}"
+    print(f"{r['backend']:<17} {r['threads']:>4} {r['batch_size']:>6} {r['accuracy']:>7.4f} "
+          f"{r['precision']['spam']:>7.4f} {r['recall']['spam']:>7.4f} {r['messages_per_sec']:>8.1f} "
+          f"{latency['p50']:>8.2f} {latency['p95']:>8.2f} {latency['p99']:>8.2f} "
+          f"{r['peak_rss_mb']:>8.0f} {filtered}")
+
+with open(args.output, "w") as f:
+    json.dump({
+        "model_path": args.model_path,
+        "split": args.split,
+        "num_messages": len(test_data),
+        "torch_version": torch.__version__,
+        "results": results,
+    }, f, indent=2)
+print(f"Results written to {args.output}")
@@ -1,29 +1,64 @@
+import argparse
+import contextlib
+import glob
+import os
+import random
+import time
+
 import torch
 from transformers import BertForSequenceClassification, AdamW, BertTokenizer
-from torch.utils.data import DataLoader, TensorDataset
-from sklearn.model_selection import train_test_split
+from torch.utils.data import DataLoader
+from sklearn.metrics import f1_score
 from sklearn.utils.class_weight import compute_class_weight
-import pandas as pd
 import numpy as np
+from dataset import BASE_DIR, LengthGroupedSampler, ShuffledBatchSampler, collate_dynamic, load_split
+
+parser = argparse.ArgumentParser(description="Fine-tune BERT for SMS spam detection.")
+parser.add_argument("--output-dir", default=os.path.join(BASE_DIR, "models", "bert_spam_model_weighted"))
+parser.add_argument("--epochs", type=int, default=3)
+parser.add_argument("--batch-size", type=int, default=16, help="Micro-batch size per forward pass")
+parser.add_argument("--grad-accum-steps", type=int, default=1, help="Micro-batches per optimizer step")
+parser.add_argument("--lr", type=float, default=2e-5)
+parser.add_argument("--bf16", action="store_true", help="CPU bf16 autocast for the forward pass")
+parser.add_argument("--fixed-padding", action="store_true",
+                    help="Old data path: shuffled batches padded to 128 tokens (for timing comparisons)")
+parser.add_argument("--seed", type=int, default=42)
+# Checkpointing
+parser.add_argument("--checkpoint-dir", default=os.path.join(BASE_DIR, "checkpoints"))
+parser.add_argument("--save-every", type=int, default=200, help="Optimizer steps between checkpoints (0 = epoch ends only)")
+parser.add_argument("--keep-checkpoints", type=int, default=3, help="Most recent checkpoints to keep")
+parser.add_argument("--resume", nargs="?", const="latest", default=None,
+                    help="Resume from a checkpoint file, or the latest one in --checkpoint-dir")
+# In-loop evaluation
+parser.add_argument("--eval-split", default=None, help="Held-out split evaluated at each epoch end (e.g. 'test')")
+parser.add_argument("--eval-every", type=int, default=0, help="Also evaluate every N optimizer steps")
+args = parser.parse_args()
+if args.keep_checkpoints < 1:
+    # Rotation slices with [:-keep], which would delete nothing at 0
+    parser.error("--keep-checkpoints must be at least 1")
 
-# Loading the dataset taken from the kaggle
-data_path = '/Users/vinaykumar/Desktop/My Projects/SMS spam detection/data/processed/train_data.csv'
-df = pd.read_csv(data_path)
+torch.manual_seed(args.seed)
+random.seed(args.seed)
+np.random.seed(args.seed)
+os.makedirs(args.checkpoint_dir, exist_ok=True)
 
-# Preparig all the inputs and labels from the above dataset 
-X_train = np.array([eval(i) for i in df['tokenized'].values])
-attention_masks_train = np.array([eval(i) for i in df['attention_mask'].values])
-y_train = df['label'].values
+# Loading the memory-mapped training split (see scripts/dataset.py)
+train_data = load_split('train')
+y_train = train_data.labels.numpy()
 
-# Converting the data to tensors
-train_inputs = torch.tensor(X_train)
-train_labels = torch.tensor(y_train)
-train_masks = torch.tensor(attention_masks_train)
+# Creating a dataloader: length-grouped batches padded to their longest member
+if args.fixed_padding:
+    sampler = ShuffledBatchSampler(len(train_data), args.batch_size, seed=args.seed)
+    train_dataloader = DataLoader(train_data, batch_sampler=sampler)
+else:
+    sampler = LengthGroupedSampler(train_data.lengths.numpy(), args.batch_size, seed=args.seed)
+    train_dataloader = DataLoader(train_data, batch_sampler=sampler, collate_fn=collate_dynamic)
 
-# Creating a dataloader
-batch_size = 16
-train_data = TensorDataset(train_inputs, train_masks, train_labels)
-train_dataloader = DataLoader(train_data, shuffle=True, batch_size=batch_size)
+eval_dataloader = None
+if args.eval_split:
+    eval_data = load_split(args.eval_split)
+    eval_sampler = LengthGroupedSampler(eval_data.lengths.numpy(), 64, seed=args.seed)
+    eval_dataloader = DataLoader(eval_data, batch_sampler=eval_sampler, collate_fn=collate_dynamic)
 
 # Calculating the class weights based on the label distribution
 class_weights = compute_class_weight('balanced', classes=[0, 1], y=y_train)
@@ -31,7 +66,7 @@ class_weights = torch.tensor(class_weights, dtype=torch.float)
 
 # Initializing the model and the ptimizer
 model = BertForSequenceClassification.from_pretrained('bert-base-uncased', num_labels=2)
-optimizer = AdamW(model.parameters(), lr=2e-5)
+optimizer = AdamW(model.parameters(), lr=args.lr)
 
 # Cchoosing the device (GPU/CPU) we want to work on
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -40,32 +75,145 @@ model.to(device)
 # Loss function along with the class weights
 loss_fn = torch.nn.CrossEntropyLoss(weight=class_weights.to(device))
 
+def autocast():
+    if args.bf16:
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+def evaluate():
+    """Spam F1 on the held-out split."""
+    model.eval()
+    predictions, labels = [], []
+    with torch.no_grad():
+        for input_ids, masks, batch_labels in eval_dataloader:
+            with autocast():
+                logits = model(input_ids.to(device), attention_mask=masks.to(device)).logits
+            predictions.append(torch.argmax(logits, dim=1).cpu().numpy())
+            labels.append(batch_labels.numpy())
+    model.train()
+    return f1_score(np.concatenate(labels), np.concatenate(predictions), pos_label=1)
+
+# --- Checkpoints ---
+# A checkpoint is written only at optimizer-step boundaries, so no partially
+# accumulated gradients need saving. `batch` is the next batch of `epoch`.
+
+def list_checkpoints():
+    return sorted(glob.glob(os.path.join(args.checkpoint_dir, "checkpoint-*.pt")))
+
+def save_checkpoint(epoch, batch, global_step, best_f1):
+    state = {
+        "model": model.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "epoch": epoch,
+        "batch": batch,
+        "global_step": global_step,
+        "best_f1": best_f1,
+        "rng": {
+            "torch": torch.get_rng_state(),
+            "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+            "numpy": np.random.get_state(),
+            "python": random.getstate(),
+        },
+        "args": vars(args),
+    }
+    path = os.path.join(args.checkpoint_dir, f"checkpoint-{global_step:08d}.pt")
+    # Write then rename, so a crash mid-save never leaves a truncated "latest" checkpoint
+    torch.save(state, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+    # Rotate old checkpoints (the best model is kept separately)
+    for old in list_checkpoints()[:-args.keep_checkpoints]:
+        os.remove(old)
+    print(f"Saved checkpoint {path}")
+
+def load_checkpoint(path):
+    # The checkpoint holds numpy/python RNG state, which weights_only loading (the default since torch 2.6) rejects
+    state = torch.load(path, map_location=device, weights_only=False)
+    model.load_state_dict(state["model"])
+    optimizer.load_state_dict(state["optimizer"])
+    torch.set_rng_state(state["rng"]["torch"])
+    if state["rng"]["cuda"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["rng"]["cuda"])
+    np.random.set_state(state["rng"]["numpy"])
+    random.setstate(state["rng"]["python"])
+    print(f"Resumed from {path} (epoch {state['epoch'] + 1}, batch {state['batch']}, step {state['global_step']})")
+    return state["epoch"], state["batch"], state["global_step"], state["best_f1"]
+
+best_dir = os.path.join(args.checkpoint_dir, "best")
+
+def maybe_save_best(f1, best_f1):
+    print(f"Eval spam F1: {f1:.4f} (best {max(f1, best_f1):.4f})")
+    if f1 > best_f1:
+        model.save_pretrained(best_dir)
+        return f1
+    return best_f1
+
+start_epoch, start_batch, global_step, best_f1 = 0, 0, 0, -1.0
+if args.resume:
+    checkpoints = list_checkpoints()
+    path = args.resume if args.resume != "latest" else (checkpoints[-1] if checkpoints else None)
+    if path:
+        start_epoch, start_batch, global_step, best_f1 = load_checkpoint(path)
+    else:
+        print(f"No checkpoint found in {args.checkpoint_dir}, starting from scratch.")
+
+print(f"Effective batch size: {args.batch_size * args.grad_accum_steps} "
+      f"({args.batch_size} x {args.grad_accum_steps} accumulation steps), "
+      f"{'fixed' if args.fixed_padding else 'dynamic'} padding, bf16={'on' if args.bf16 else 'off'}")
+
 # Training loop
-epochs = 3
-for epoch in range(epochs):
+epoch_times = []
+for epoch in range(start_epoch, args.epochs):
     model.train()
+    sampler.set_epoch(epoch, start_batch if epoch == start_epoch else 0)
+    first_batch = sampler.start_batch
     total_loss = 0
-    
-    for step, batch in enumerate(train_dataloader):
+    padded_tokens = 0
+    started = time.perf_counter()
+
+    model.zero_grad()
+    for step, batch in enumerate(train_dataloader, start=first_batch):
         batch_input_ids = batch[0].to(device)
         batch_input_mask = batch[1].to(device)
         batch_labels = batch[2].to(device)
-        
-        model.zero_grad()
-        
-        outputs = model(batch_input_ids, token_type_ids=None, attention_mask=batch_input_mask)
-        logits = outputs.logits
-        loss = loss_fn(logits, batch_labels)
+        padded_tokens += batch_input_ids.numel()
+
+        with autocast():
+            outputs = model(batch_input_ids, token_type_ids=None, attention_mask=batch_input_mask)
+        # Loss in fp32 so the class weights are applied at full precision
+        loss = loss_fn(outputs.logits.float(), batch_labels)
         total_loss += loss.item()
-        
-        loss.backward()
-        optimizer.step()
-    
-    print(f'Epoch {epoch + 1} Loss: {total_loss / len(train_dataloader)}')
-
-# Saving the model and tokenizer
-model.save_pretrained('/Users/vinaykumar/Desktop/My Projects/SMS spam detection/models/bert_spam_model_weighted')
+
+        (loss / args.grad_accum_steps).backward()
+        if (step + 1) % args.grad_accum_steps == 0 or step + 1 == len(sampler):
+            optimizer.step()
+            model.zero_grad()
+            global_step += 1
+
+            if eval_dataloader is not None and args.eval_every and global_step % args.eval_every == 0:
+                best_f1 = maybe_save_best(evaluate(), best_f1)
+            if args.save_every and global_step % args.save_every == 0 and step + 1 < len(sampler):
+                save_checkpoint(epoch, step + 1, global_step, best_f1)
+
+    batches_run = len(sampler) - first_batch
+    epoch_times.append(time.perf_counter() - started)
+    print(f'Epoch {epoch + 1} Loss: {total_loss / max(1, batches_run)} '
+          f'Time: {epoch_times[-1]:.1f}s Tokens/row: {padded_tokens / max(1, batches_run * args.batch_size):.1f}')
+
+    if eval_dataloader is not None:
+        best_f1 = maybe_save_best(evaluate(), best_f1)
+    save_checkpoint(epoch + 1, 0, global_step, best_f1)
+
+if epoch_times:
+    print(f"Mean epoch wall time: {np.mean(epoch_times):.1f}s")
+
+# Saving the model (the best evaluated one, if evaluation ran) and tokenizer
+if eval_dataloader is not None and os.path.isdir(best_dir):
+    model = BertForSequenceClassification.from_pretrained(best_dir)
+    print(f"Exporting best checkpoint (spam F1 {best_f1:.4f})")
+# safetensors weights are memory-mapped by the API at startup
+model.save_pretrained(args.output_dir, safe_serialization=True)
 tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
-tokenizer.save_pretrained('/Users/vinaykumar/Desktop/My Projects/SMS spam detection/models/bert_spam_model_weighted')
+tokenizer.save_pretrained(args.output_dir)
 
 print("Model and tokenizer saved successfully.")
@@ -0,0 +1,123 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import cross_val_predict
+from data_preprocessing import load_config, read_split_texts
+from dataset import BASE_DIR
+
+sys.path.insert(0, BASE_DIR)
+from app.cascade import CASCADE_PATH, FirstStageFilter, hashed_features  # noqa: E402
+
+# Trains the first-stage filter of the cascade (see app/cascade.py) from the raw
+# CSV, using the same train/test assignment as data_preprocessing.py. The
+# confidence thresholds are chosen from cross-validated training predictions,
+# so that at most --max-error of the messages the filter answers on each side
+# are wrong. Everything in between is deferred to BERT.
+
+defaults = load_config()
+
+parser = argparse.ArgumentParser(description="Train the hashed n-gram first-stage spam filter.")
+parser.add_argument("--input", default=defaults.get("input", "data/raw/spam.csv"))
+parser.add_argument("--output-dir", default=CASCADE_PATH)
+parser.add_argument("--test-size", type=float, default=defaults.get("test_size", 0.2))
+parser.add_argument("--seed", type=int, default=defaults.get("seed", 42))
+parser.add_argument("--split-method", choices=["hash", "legacy"], default=defaults.get("split_method", "legacy"))
+parser.add_argument("--n-features", type=int, default=2 ** 18, help="Hash space size (a power of two)")
+parser.add_argument("--char-ngram", type=int, default=3)
+parser.add_argument("--C", type=float, default=10.0, help="Inverse L2 regularization strength")
+parser.add_argument("--max-error", type=float, default=0.005,
+                    help="Max error rate among the messages the filter answers, per side")
+args = parser.parse_args()
+
+
+def featurize(texts):
+    indices, indptr = [], [0]
+    for text in texts:
+        indices.extend(hashed_features(text, args.n_features, args.char_ngram))
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    return csr_matrix((data, indices, indptr), shape=(len(texts), args.n_features))
+
+
+def choose_thresholds(probabilities, labels, max_error):
+    """Widest (ham_threshold, spam_threshold) band whose answered messages meet max_error per side."""
+    order = np.argsort(probabilities)
+    p, y = probabilities[order], labels[order]
+
+    # Ham side: answer the lowest-probability messages while the spam fraction stays low
+    spam_seen = np.cumsum(y)
+    ham_ok = spam_seen / np.arange(1, len(y) + 1) <= max_error
+    ham_threshold = float(p[np.nonzero(ham_ok)[0].max()]) if ham_ok.any() else 0.0
+
+    # Spam side: the same from the top
+    ham_seen = np.cumsum(1 - y[::-1])
+    spam_ok = ham_seen / np.arange(1, len(y) + 1) <= max_error
+    spam_threshold = float(p[::-1][np.nonzero(spam_ok)[0].max()]) if spam_ok.any() else 1.0
+
+    # Overlapping bands: every message can be answered within max_error on some
+    # side, so use a single cut at 0.5, the classifier's own decision
+    if ham_threshold >= spam_threshold:
+        ham_threshold = spam_threshold = 0.5
+    return ham_threshold, spam_threshold
+
+
+def report(name, probabilities, labels, ham_threshold, spam_threshold):
+    ham = probabilities <= ham_threshold
+    spam = probabilities >= spam_threshold
+    answered = ham | spam
+    predictions = np.where(spam, 1, 0)
+    accuracy = accuracy_score(labels[answered], predictions[answered]) if answered.any() else float("nan")
+    print(f"{name:<24} {ham_threshold:>8.4f} {spam_threshold:>8.4f} {answered.mean():>9.2%} "
+          f"{ham.mean():>7.2%} {spam.mean():>7.2%} {accuracy:>9.4f}")
+    return {
+        "ham_threshold": ham_threshold,
+        "spam_threshold": spam_threshold,
+        "coverage": float(answered.mean()),
+        "accuracy_on_answered": float(accuracy),
+    }
+
+
+data = read_split_texts(os.path.join(BASE_DIR, args.input), args.test_size, args.seed, args.split_method)
+train_texts, y_train = data["train"][0], np.array(data["train"][1])
+test_texts, y_test = data["test"][0], np.array(data["test"][1])
+print(f"train: {len(train_texts)} messages, test: {len(test_texts)} messages")
+
+started = time.perf_counter()
+X_train = featurize(train_texts)
+X_test = featurize(test_texts)
+print(f"Hashed features in {time.perf_counter() - started:.1f}s")
+
+# Class-balanced, like the BERT loss, so the rarer spam class is not under-weighted
+classifier = LogisticRegression(C=args.C, class_weight="balanced", max_iter=1000)
+cv_probabilities = cross_val_predict(classifier, X_train, y_train, cv=5, method="predict_proba")[:, 1]
+ham_threshold, spam_threshold = choose_thresholds(cv_probabilities, y_train, args.max_error)
+
+classifier.fit(X_train, y_train)
+test_probabilities = classifier.predict_proba(X_test)[:, 1]
+
+print(f"\n{'thresholds':<24} {'ham <=':>8} {'spam >=':>8} {'answered':>9} {'ham':>7} {'spam':>7} {'accuracy':>9}")
+results = {
+    "chosen": report("chosen (test)", test_probabilities, y_test, ham_threshold, spam_threshold),
+}
+for low, high in ((0.01, 0.99), (0.05, 0.95), (0.1, 0.9), (0.5, 0.5)):
+    results[f"{low}-{high}"] = report(f"fixed {low}/{high} (test)", test_probabilities, y_test, low, high)
+
+first_stage = FirstStageFilter(
+    classifier.coef_[0].astype(np.float32), classifier.intercept_[0],
+    ham_threshold, spam_threshold, args.char_ngram
+)
+first_stage.save(args.output_dir, max_error=args.max_error, test=results)
+
+# Per-message latency of the serving code path
+sample = test_texts[:1000]
+started = time.perf_counter()
+for message in sample:
+    first_stage.decide(message)
+print(f"\nFilter latency: {1e6 * (time.perf_counter() - started) / max(1, len(sample)):.0f} us/message")
+print(f"First-stage filter saved to {args.output_dir}")